@@ -0,0 +1,190 @@
+import math
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+# Число запросов к базе из заголовка Server-Timing (core.middleware).
+SERVER_TIMING_QUERIES = re.compile(r'\bdb;[^,]*desc="(\d+) queries"')
+# Показатели, которые сравниваются с базовым прогоном, и направление,
+# в котором они ухудшаются: 1 — рост, -1 — падение.
+COMPARED = (
+    ('p50_ms', 1),
+    ('p95_ms', 1),
+    ('p99_ms', 1),
+    ('queries_per_request', 1),
+    ('throughput_rps', -1),
+)
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу: значение, не меньше которого
+    доля fraction отсортированных values."""
+    if not values:
+        return None
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def server_timing_queries(header):
+    match = SERVER_TIMING_QUERIES.search(header or '')
+    return int(match.group(1)) if match else None
+
+
+class InProcessClient:
+    """Тестовый клиент Django: весь стек middleware и view, без сети."""
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def request(self, method, path, data):
+        if method == 'POST':
+            response = self.client.post(path, data)
+        else:
+            response = self.client.get(path, data)
+        return response.status_code, response.get('Server-Timing')
+
+
+class HttpClient:
+    """Клиент запущенного сервера (runserver, gunicorn) по base_url."""
+
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        login = reverse('users:login')
+        # Форма входа выдаёт cookie csrftoken.
+        self.session.get(self.base_url + login)
+        response = self.session.post(
+            self.base_url + login,
+            data={
+                'username': username,
+                'password': password,
+                'csrfmiddlewaretoken': self.session.cookies['csrftoken'],
+            },
+            allow_redirects=False,
+        )
+        if 'sessionid' not in self.session.cookies:
+            raise ValueError(
+                f'Не удалось войти как {username}: {response.status_code}'
+            )
+
+    def request(self, method, path, data):
+        if method == 'POST':
+            data = dict(
+                data, csrfmiddlewaretoken=self.session.cookies['csrftoken']
+            )
+        response = self.session.request(
+            method,
+            self.base_url + path,
+            params=data if method == 'GET' else None,
+            data=data if method == 'POST' else None,
+            allow_redirects=False,
+        )
+        return response.status_code, response.headers.get('Server-Timing')
+
+
+def _worker(make_client, scenario, count, seed, threaded):
+    rng = random.Random(seed)
+    latencies, queries, errors = [], [], 0
+    try:
+        client = make_client(rng)
+        for _ in range(count):
+            method, path, data = scenario(rng)
+            started = time.perf_counter()
+            try:
+                status, timing = client.request(method, path, data)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+            queries.append(server_timing_queries(timing))
+    finally:
+        if threaded:
+            # У каждого потока своё соединение с базой.
+            connections.close_all()
+    return latencies, queries, errors
+
+
+def summarize(latencies, queries, errors, wall_time):
+    latencies = sorted(latencies)
+    counted = [value for value in queries if value is not None]
+
+    def ms(seconds):
+        return None if seconds is None else round(seconds * 1000, 2)
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall_time, 1)
+        if wall_time else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 0.5)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+        'queries_per_request': round(sum(counted) / len(counted), 2)
+        if counted else None,
+    }
+
+
+def run_scenario(scenario, make_client, requests_count, concurrency=1,
+                 warmup=0, seed=0):
+    """Прогоняет сценарий: requests_count запросов от concurrency
+    клиентов, каждый в своём потоке. make_client(rng) создаёт клиента,
+    scenario(rng) — очередной запрос (method, path, data).
+
+    Запросы прогрева прогревают кэши и в отчёт не попадают.
+    """
+    if warmup:
+        _worker(make_client, scenario, warmup, seed, threaded=False)
+    shares = [
+        requests_count // concurrency + (index < requests_count % concurrency)
+        for index in range(concurrency)
+    ]
+    started = time.perf_counter()
+    if concurrency == 1:
+        # В том же потоке: тестам виден их незафиксированный набор данных.
+        results = [_worker(make_client, scenario, shares[0], seed, False)]
+    else:
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(
+                lambda index: _worker(
+                    make_client, scenario, shares[index], seed + index, True
+                ),
+                range(concurrency),
+            ))
+    wall_time = time.perf_counter() - started
+    latencies, queries, errors = [], [], 0
+    for worker_latencies, worker_queries, worker_errors in results:
+        latencies += worker_latencies
+        queries += worker_queries
+        errors += worker_errors
+    return summarize(latencies, queries, errors, wall_time)
+
+
+def compare(results, baseline, tolerance):
+    """Сравнение с базовым прогоном: {view: [(показатель, значение,
+    базовое, изменение в долях, регрессия ли)]}."""
+    changes = {}
+    for view, stats in results.items():
+        base = baseline.get(view)
+        if not base:
+            continue
+        rows = []
+        for metric, direction in COMPARED:
+            value, before = stats.get(metric), base.get(metric)
+            if value is None or not before:
+                continue
+            change = (value - before) / before
+            rows.append(
+                (metric, value, before, change, direction * change > tolerance)
+            )
+        changes[view] = rows
+    return changes
@@ -0,0 +1,89 @@
+import glob
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import fingerprint
+
+
+def needs_index(step):
+    """Шаг плана, которому, скорее всего, нужен индекс: полный проход
+    по таблице или сортировка во временном B-дереве."""
+    return 'TEMP B-TREE' in step or (
+        step.startswith('SCAN') and 'USING' not in step
+    )
+
+
+def read_log(path):
+    """Записи журнала вместе с файлами после ротации (path.1, path.2, ...)."""
+    for name in sorted(glob.glob(f'{path}.*')) + [path]:
+        try:
+            with open(name, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+
+
+class Command(BaseCommand):
+    help = 'Сводка журнала медленных запросов по отпечаткам запросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', default=settings.SLOW_QUERY_LOG,
+            help='Файл журнала (по умолчанию SLOW_QUERY_LOG)'
+        )
+        parser.add_argument(
+            '--view', help='Только запросы этого view, например posts:index'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько групп показать'
+        )
+
+    def handle(self, *args, **options):
+        groups = defaultdict(lambda: {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'views': set(), 'callers': set(),
+        })
+        for record in read_log(options['log']):
+            if options['view'] and record.get('view') != options['view']:
+                continue
+            key, normalized = fingerprint(record['sql'])
+            group = groups[key]
+            group['count'] += 1
+            group['total_ms'] += record['duration_ms']
+            group['max_ms'] = max(group['max_ms'], record['duration_ms'])
+            group['views'].add(record.get('view') or '-')
+            if record.get('caller'):
+                group['callers'].add(record['caller'])
+            group['sql'] = normalized
+            group['plan'] = record.get('plan') or []
+        if not groups:
+            self.stdout.write('Медленных запросов нет')
+            return
+        ranked = sorted(
+            groups.items(), key=lambda item: item[1]['total_ms'], reverse=True
+        )
+        for key, group in ranked[:options['limit']]:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                '{} — {} раз, всего {:.1f} мс, среднее {:.1f} мс, '
+                'максимум {:.1f} мс'.format(
+                    key, group['count'], group['total_ms'],
+                    group['total_ms'] / group['count'], group['max_ms']
+                )
+            ))
+            self.stdout.write('  view: ' + ', '.join(sorted(group['views'])))
+            for caller in sorted(group['callers']):
+                self.stdout.write(f'  вызов: {caller}')
+            self.stdout.write(f'  {group["sql"]}')
+            for step in group['plan']:
+                line = f'  план: {step}'
+                if needs_index(step):
+                    line = self.style.WARNING(line)
+                self.stdout.write(line)
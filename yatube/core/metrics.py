@@ -0,0 +1,270 @@
+import glob
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+# Верхние границы корзин гистограммы времени ответа, в секундах.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+CACHE_OUTCOMES = ('hit', 'stale', 'miss')
+
+_local = threading.local()
+# Пары (поток, его счётчики) и сумма счётчиков завершившихся потоков.
+_shards = []
+_retired = defaultdict(float)
+_shards_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+# pid процесса и суффикс имени его файла счётчиков.
+_process = None
+
+
+def _shard():
+    """Счётчики текущего потока.
+
+    Каждый поток пишет только в свой словарь, поэтому запись идёт
+    без блокировок; блокировка берётся один раз, когда поток
+    регистрирует свой словарь.
+    """
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = defaultdict(float)
+        with _shards_lock:
+            _retire_dead_shards()
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+
+def _retire_dead_shards():
+    # Сервер, создающий поток на каждый запрос, иначе копил бы словари.
+    alive = []
+    for thread, shard in _shards:
+        if thread.is_alive():
+            alive.append((thread, shard))
+            continue
+        for key, value in shard.items():
+            _retired[key] += value
+    _shards[:] = alive
+
+
+def _bucket(duration):
+    for index, bound in enumerate(LATENCY_BUCKETS):
+        if duration <= bound:
+            return index
+    return len(LATENCY_BUCKETS)
+
+
+def observe_request(view, status, duration, timings):
+    """Учитывает завершённый запрос к view (например, 'posts:index')."""
+    shard = _shard()
+    shard['requests', view, str(status)] += 1
+    shard['duration_bucket', view, _bucket(duration)] += 1
+    shard['duration_sum', view] += duration
+    shard['db_queries', view] += timings.db_queries
+    shard['db_seconds', view] += timings.db_time
+    for outcome in CACHE_OUTCOMES:
+        if timings.cache[outcome]:
+            shard['cache', view, outcome] += timings.cache[outcome]
+    if settings.METRICS_MULTIPROC_DIR:
+        _maybe_flush()
+
+
+def snapshot():
+    """Сумма счётчиков всех потоков процесса."""
+    with _shards_lock:
+        _retire_dead_shards()
+        shards = [shard for thread, shard in _shards]
+        total = defaultdict(float, _retired)
+    for shard in shards:
+        # Копия словаря делается целиком, пока другие потоки пишут в свои.
+        for key, value in shard.copy().items():
+            total[key] += value
+    return total
+
+
+def _process_file(directory):
+    # pid завершившегося процесса может достаться новому, и тот
+    # перезаписал бы его счётчики: к pid добавляется случайный суффикс,
+    # свой у каждого процесса (после fork он создаётся заново).
+    global _process
+    pid = os.getpid()
+    if _process is None or _process[0] != pid:
+        _process = (pid, secrets.token_hex(4))
+    return os.path.join(directory, 'metrics-{}-{}.json'.format(*_process))
+
+
+def flush():
+    """Сохраняет счётчики процесса в METRICS_MULTIPROC_DIR."""
+    directory = settings.METRICS_MULTIPROC_DIR
+    path = _process_file(directory)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump([[list(key), value] for key, value in snapshot().items()],
+                  file)
+    os.replace(temporary, path)
+
+
+def _maybe_flush():
+    global _last_flush
+    now = time.monotonic()
+    if now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+        return
+    # Сохраняет один поток, остальные не ждут.
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _last_flush = now
+        flush()
+    finally:
+        _flush_lock.release()
+
+
+def collect():
+    """Счётчики для /metrics: этого процесса или всех рабочих процессов.
+
+    При METRICS_MULTIPROC_DIR каждый процесс раз в METRICS_FLUSH_INTERVAL
+    секунд сохраняет свои счётчики в отдельный файл, а /metrics
+    складывает все файлы. Файлы завершившихся процессов остаются,
+    чтобы счётчики не уменьшались; каталог очищают при перезапуске.
+    """
+    directory = settings.METRICS_MULTIPROC_DIR
+    if not directory:
+        return snapshot()
+    flush()
+    total = defaultdict(float)
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            with open(path) as file:
+                rows = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for key, value in rows:
+            total[tuple(key)] += value
+    return total
+
+
+def _sample(name, value, **labels):
+    labels = ','.join(
+        '{}="{}"'.format(label, str(text).replace('"', '\\"'))
+        for label, text in labels.items()
+    )
+    if float(value).is_integer():
+        value = int(value)
+    return f'{name}{{{labels}}} {value}'
+
+
+def _header(name, kind, help_text):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+
+
+def _group(counters):
+    """Счётчики по семействам: {имя: {view: значение}}.
+
+    Если у ключа есть третья часть (статус, корзина, исход кэша),
+    значение — словарь по ней.
+    """
+    grouped = defaultdict(lambda: defaultdict(dict))
+    for key, value in counters.items():
+        name, view, *rest = key
+        if rest:
+            grouped[name][view][rest[0]] = value
+        else:
+            grouped[name][view] = value
+    return grouped
+
+
+def _requests(requests):
+    lines = _header(
+        'yatube_requests_total', 'counter', 'Ответы по view и коду статуса.'
+    )
+    for view, statuses in sorted(requests.items()):
+        for status, value in sorted(statuses.items()):
+            lines.append(_sample(
+                'yatube_requests_total', value, view=view, status=status
+            ))
+    return lines
+
+
+def _durations(buckets, sums):
+    lines = _header(
+        'yatube_request_duration_seconds', 'histogram', 'Время ответа view.'
+    )
+    bounds = [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+    for view, counts in sorted(buckets.items()):
+        counts = {int(index): value for index, value in counts.items()}
+        cumulative = 0
+        for index, bound in enumerate(bounds):
+            cumulative += counts.get(index, 0)
+            lines.append(_sample(
+                'yatube_request_duration_seconds_bucket', cumulative,
+                view=view, le=bound
+            ))
+        lines.append(_sample(
+            'yatube_request_duration_seconds_sum', sums.get(view, 0),
+            view=view
+        ))
+        lines.append(_sample(
+            'yatube_request_duration_seconds_count', cumulative, view=view
+        ))
+    return lines
+
+
+def _view_counter(name, help_text, values):
+    return _header(name, 'counter', help_text) + [
+        _sample(name, value, view=view)
+        for view, value in sorted(values.items())
+    ]
+
+
+def _cache_requests(cache):
+    lines = _header(
+        'yatube_cache_requests_total', 'counter',
+        'Обращения к кэшу страниц: hit, stale (устаревшая копия), miss.'
+    )
+    for view, outcomes in sorted(cache.items()):
+        for outcome, value in sorted(outcomes.items()):
+            lines.append(_sample(
+                'yatube_cache_requests_total', value,
+                view=view, outcome=outcome
+            ))
+    return lines
+
+
+def _cache_hit_ratio(cache):
+    lines = _header(
+        'yatube_cache_hit_ratio', 'gauge',
+        'Доля обращений к кэшу страниц без пересборки.'
+    )
+    for view, outcomes in sorted(cache.items()):
+        served = outcomes.get('hit', 0) + outcomes.get('stale', 0)
+        lines.append(_sample(
+            'yatube_cache_hit_ratio',
+            round(served / sum(outcomes.values()), 4), view=view
+        ))
+    return lines
+
+
+def render(counters):
+    """Счётчики в текстовом формате Prometheus."""
+    grouped = _group(counters)
+    lines = (
+        _requests(grouped['requests'])
+        + _durations(grouped['duration_bucket'], grouped['duration_sum'])
+        + _view_counter(
+            'yatube_db_queries_total', 'SQL-запросы, выполненные view.',
+            grouped['db_queries']
+        )
+        + _view_counter(
+            'yatube_db_seconds_total', 'Время SQL-запросов view.',
+            grouped['db_seconds']
+        )
+        + _cache_requests(grouped['cache'])
+        + _cache_hit_ratio(grouped['cache'])
+    )
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,176 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+from importlib import import_module
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from . import metrics, timing
+
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger('core.requests')
+
+# Списки IN (%s, %s, ...) разной длины — один и тот же запрос.
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+# Управление транзакциями не считаем: точек сохранения внутри
+# тестовой транзакции больше, чем в рабочем запросе.
+TRANSACTION_CONTROL = re.compile(
+    r'\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE
+)
+
+
+class QueryBudgetExceeded(Exception):
+    """View выполнил больше SQL-запросов, чем ему отведено."""
+
+
+@lru_cache(maxsize=None)
+def url_budgets(namespace):
+    """Бюджеты из QUERY_BUDGETS модуля <namespace>.urls."""
+    try:
+        module = import_module(f'{namespace}.urls')
+    except ImportError:
+        return {}
+    return getattr(module, 'QUERY_BUDGETS', {})
+
+
+def query_budget(resolver_match):
+    if (resolver_match is None or not resolver_match.url_name
+            or not resolver_match.namespace):
+        return None
+    return url_budgets(resolver_match.namespace).get(resolver_match.url_name)
+
+
+class QueryCounter:
+    """execute_wrapper, который считает запросы по их «форме»."""
+
+    def __init__(self):
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not TRANSACTION_CONTROL.match(sql):
+            self.shapes[IN_LIST.sub('(%s...)', sql)] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def total(self):
+        return sum(self.shapes.values())
+
+    def repeated(self, limit):
+        """Запросы одной формы, выполненные больше limit раз (N+1)."""
+        return {
+            sql: count for sql, count in self.shapes.items() if count > limit
+        }
+
+
+class QueryBudgetMiddleware:
+    """Следит за числом SQL-запросов на запрос.
+
+    Бюджет view задаётся по имени URL в QUERY_BUDGETS модуля urls
+    приложения (например, posts.urls). Отдельно ищутся повторы
+    одного и того же запроса — типичный признак N+1.
+    При DEBUG нарушения пишутся в лог, при QUERY_BUDGET_STRICT
+    (его включает тестовый раннер) — поднимают QueryBudgetExceeded.
+    """
+
+    def __init__(self, get_response):
+        if not (settings.DEBUG or settings.QUERY_BUDGET_STRICT):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        problems = self.check(request.resolver_match, counter)
+        if problems:
+            message = '{}: {}'.format(request.path, '; '.join(problems))
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def check(self, resolver_match, counter):
+        problems = []
+        budget = query_budget(resolver_match)
+        if budget is not None and counter.total > budget:
+            problems.append(
+                f'{counter.total} SQL-запросов при бюджете {budget}'
+            )
+        for sql, count in counter.repeated(
+            settings.QUERY_BUDGET_REPEAT_LIMIT
+        ).items():
+            problems.append(f'запрос повторён {count} раз: {sql[:200]}')
+        return problems
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class ServerTimingMiddleware:
+    """Замеры запроса в заголовке Server-Timing и в строке лога.
+
+    Время SQL (execute_wrapper), рендеринга шаблонов
+    (core.timing.TimedDjangoTemplates), view и обращения к кэшу
+    страниц (posts.caching). Строка лога — JSON в логгер core.requests.
+    Те же замеры копятся в счётчиках /metrics (core.metrics).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = timing.start_request()
+        try:
+            with connection.execute_wrapper(timings):
+                response = self.get_response(request)
+        finally:
+            timing.finish_request()
+        finished = time.perf_counter()
+        total = finished - timings.started
+        view = finished - (timings.view_started or timings.started)
+        cache = timings.cache
+        match = request.resolver_match
+        # Метки — имена view, а не пути: их число ограничено.
+        view_name = match.view_name if match else 'unresolved'
+        metrics.observe_request(
+            view_name, response.status_code, total, timings
+        )
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={_ms(timings.db_time)};'
+                f'desc="{timings.db_queries} queries"',
+                f'tpl;dur={_ms(timings.template_time)}',
+                f'view;dur={_ms(view)}',
+                f'total;dur={_ms(total)}',
+                'cache;desc="hit={hit} stale={stale} miss={miss}"'.format(
+                    **cache
+                ),
+            ))
+        if request_logger.isEnabledFor(logging.INFO):
+            request_logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'view': view_name,
+                'status': response.status_code,
+                'total_ms': _ms(total),
+                'view_ms': _ms(view),
+                'db_ms': _ms(timings.db_time),
+                'db_queries': timings.db_queries,
+                'template_ms': _ms(timings.template_time),
+                'cache_hits': cache['hit'],
+                'cache_stale': cache['stale'],
+                'cache_misses': cache['miss'],
+            }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = timing.current()
+        if timings is not None:
+            timings.view_started = time.perf_counter()
+            timings.view_name = request.resolver_match.view_name
@@ -0,0 +1,20 @@
+import logging
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class ProjectTestRunner(DiscoverRunner):
+    """Тестовый раннер проекта.
+
+    Превышение бюджета SQL-запросов роняет тест; строки лога
+    запросов (core.requests) в выводе тестов не печатаются,
+    журнал медленных запросов не ведётся, миниатюры делаются сразу.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_STRICT = True
+        logging.getLogger('core.requests').setLevel(logging.WARNING)
+        settings.SLOW_QUERY_THRESHOLD = None
+        settings.THUMBNAIL_WORKER = 'sync'
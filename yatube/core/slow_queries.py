@@ -0,0 +1,99 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import timing
+
+logger = logging.getLogger(__name__)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+SPACES = re.compile(r'\s+')
+# Кадры Django и этого модуля пропускаем: нужен код проекта.
+OWN_FILE = os.path.abspath(__file__)
+
+
+def fingerprint(sql):
+    """Отпечаток запроса: одинаков для запросов, отличающихся
+    только значениями (литералы, LIMIT, длина списков IN)."""
+    normalized = STRING_LITERAL.sub('?', sql)
+    normalized = NUMBER.sub('N', normalized)
+    normalized = PLACEHOLDER_LIST.sub('(?...)', normalized)
+    normalized = SPACES.sub(' ', normalized).strip().replace('%s', '?')
+    return hashlib.md5(normalized.encode()).hexdigest()[:12], normalized
+
+
+def _caller():
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(base_dir) and filename != OWN_FILE
+                and 'site-packages' not in filename):
+            return f'{frame.filename}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def _explain(connection, sql, params):
+    """EXPLAIN QUERY PLAN на отдельном курсоре бэкенда.
+
+    Курсор берётся мимо execute_wrapper, поэтому EXPLAIN не попадает
+    ни в этот лог (нет рекурсии), ни в счётчики запросов.
+    """
+    if connection.vendor != 'sqlite' or not sql.lstrip().upper().startswith(
+        ('SELECT', 'WITH')
+    ):
+        return None
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+    except Exception as error:
+        return [f'EXPLAIN не выполнен: {error}']
+    finally:
+        cursor.close()
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    """execute_wrapper: пишет в лог запросы дольше SLOW_QUERY_THRESHOLD."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        threshold = settings.SLOW_QUERY_THRESHOLD
+        if threshold is not None and duration >= threshold:
+            log_slow_query(context['connection'], sql, params, many, duration)
+
+
+def log_slow_query(connection, sql, params, many, duration):
+    timings = timing.current()
+    key, normalized = fingerprint(sql)
+    logger.warning(json.dumps({
+        'time': timezone.now().isoformat(),
+        'duration_ms': round(duration * 1000, 2),
+        'fingerprint': key,
+        'sql': sql,
+        'params': (
+            params if settings.SLOW_QUERY_LOG_PARAMS and not many else None
+        ),
+        'view': timings.view_name if timings else None,
+        'caller': _caller(),
+        'plan': None if many else _explain(connection, sql, params),
+    }, default=str, ensure_ascii=False))
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created: подключает журнал к соединению."""
+    if slow_query_wrapper not in connection.execute_wrappers:
+        # В начало списка: соединение может открыться внутри
+        # with connection.execute_wrapper(...), который при выходе
+        # снимает последнюю обёртку.
+        connection.execute_wrappers.insert(0, slow_query_wrapper)
@@ -1,5 +1,25 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from core.benchmark import compare, percentile, server_timing_queries
+from core.middleware import QueryBudgetExceeded, QueryBudgetMiddleware
+from core.views import media
+from posts import urls as posts_urls
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -16,3 +36,219 @@ class ViewTestClass(TestCase):
 
     def test_permission_denied(self):
         ...
+
+
+@override_settings(QUERY_BUDGET_STRICT=True, QUERY_BUDGET_REPEAT_LIMIT=3)
+class QueryBudgetMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_view_over_budget_fails(self):
+        """Превышение бюджета view роняет тест."""
+        with mock.patch.dict(posts_urls.QUERY_BUDGETS, {'index': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('posts:index'))
+
+    def test_repeated_queries_fail(self):
+        """Повтор одного запроса на каждый объект считается N+1."""
+        users = [User.objects.create_user(f'user_{number}') for number in
+                 range(5)]
+
+        def n_plus_one_view(request):
+            for user in users:
+                User.objects.filter(pk=user.pk).exists()
+            return HttpResponse()
+
+        middleware = QueryBudgetMiddleware(n_plus_one_view)
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        with self.assertRaises(QueryBudgetExceeded):
+            middleware(request)
+
+
+class ServerTimingMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        """В ответе время SQL, шаблонов, view и обращения к кэшу."""
+        response = self.client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'view;dur=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, header)
+        self.assertIn('hit=0', header)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('hit=1', response['Server-Timing'])
+
+    def test_request_log_line(self):
+        """Замеры пишутся в лог одной JSON-строкой."""
+        with self.assertLogs('core.requests', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'posts:index')
+        self.assertEqual(line['status'], HTTPStatus.OK)
+        self.assertGreater(line['db_queries'], 0)
+        self.assertEqual(line['cache_misses'], 2)
+
+
+@override_settings(METRICS_TOKEN='секретный-токен')
+class MetricsViewTest(TestCase):
+    INDEX_REQUESTS = 'yatube_requests_total{view="posts:index",status="200"}'
+
+    def scrape(self):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer секретный-токен'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_requests_are_counted_by_view(self):
+        """Ответы и гистограмма времени считаются по имени view."""
+        before = self.scrape().get(self.INDEX_REQUESTS, 0)
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        samples = self.scrape()
+        self.assertEqual(samples[self.INDEX_REQUESTS], before + 2)
+        self.assertEqual(
+            samples[
+                'yatube_request_duration_seconds_bucket'
+                '{view="posts:index",le="+Inf"}'
+            ],
+            samples[self.INDEX_REQUESTS]
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', samples)
+
+    def test_metrics_require_token(self):
+        """Без верного токена, как и без настроенного, /metrics не виден."""
+        for header in ('', 'Bearer чужой-токен', 'секретный-токен'):
+            with self.subTest(header=header):
+                response = self.client.get(
+                    reverse('metrics'), HTTP_AUTHORIZATION=header
+                )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        with self.settings(METRICS_TOKEN=''):
+            response = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer '
+            )
+            self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_reused_pid_gets_own_file(self):
+        """Новый процесс с pid завершившегося не затирает его счётчики."""
+        with mock.patch('core.metrics._process', None):
+            first = metrics._process_file('metrics')
+        with mock.patch('core.metrics._process', None):
+            second = metrics._process_file('metrics')
+        self.assertNotEqual(first, second)
+
+    def test_metrics_of_processes_are_merged(self):
+        """Счётчики других рабочих процессов складываются с нашими."""
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'metrics-1.json'), 'w') as file:
+                json.dump([[['requests', 'posts:index', '200'], 1000]], file)
+            with self.settings(METRICS_MULTIPROC_DIR=directory):
+                merged = self.scrape()[self.INDEX_REQUESTS]
+        own = metrics.snapshot()['requests', 'posts:index', '200']
+        self.assertEqual(merged, own + 1000)
+
+
+class SlowQueryLogTest(TestCase):
+    def test_slow_query_is_logged_with_plan(self):
+        """Медленный запрос пишется с view и планом EXPLAIN."""
+        cache.clear()
+        with self.settings(SLOW_QUERY_THRESHOLD=0):
+            with self.assertLogs('core.slow_queries', 'WARNING') as logs:
+                self.client.get(reverse('posts:index'))
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        feed = [
+            record for record in records
+            if 'FROM "posts_post"' in record['sql']
+        ][0]
+        self.assertEqual(feed['view'], 'posts:index')
+        self.assertTrue(feed['plan'])
+        self.assertEqual(len(feed['fingerprint']), 12)
+
+    def test_params_logged_only_when_enabled(self):
+        """Параметры запросов по умолчанию не пишутся в журнал."""
+        for enabled in (False, True):
+            with self.subTest(enabled=enabled):
+                with self.settings(SLOW_QUERY_THRESHOLD=0,
+                                   SLOW_QUERY_LOG_PARAMS=enabled):
+                    with self.assertLogs('core.slow_queries') as logs:
+                        User.objects.filter(username='секрет').exists()
+                record = json.loads(logs.records[-1].getMessage())
+                self.assertEqual('секрет' in str(record['params']), enabled)
+
+    def test_report_groups_by_fingerprint(self):
+        """Отчёт складывает запросы, отличающиеся только значениями."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow.jsonl')
+            with open(path, 'w') as file:
+                for pk in (1, 2):
+                    file.write(json.dumps({
+                        'sql': f'SELECT * FROM "posts_post" WHERE id = {pk}',
+                        'duration_ms': 150, 'view': 'posts:index',
+                        'plan': ['SCAN posts_post'],
+                    }) + '\n')
+            output = StringIO()
+            call_command('slow_query_report', log=path, stdout=output)
+        self.assertIn('2 раз, всего 300.0 мс', output.getvalue())
+        self.assertIn('id = N', output.getvalue())
+
+
+class BenchmarkTest(TestCase):
+    def test_percentile(self):
+        latencies = list(range(1, 101))
+        self.assertEqual(percentile(latencies, 0.5), 50)
+        self.assertEqual(percentile(latencies, 0.95), 95)
+        self.assertEqual(percentile(latencies, 0.99), 99)
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_queries_from_server_timing(self):
+        header = 'db;dur=1.5;desc="4 queries", tpl;dur=2, total;dur=5'
+        self.assertEqual(server_timing_queries(header), 4)
+        self.assertIsNone(server_timing_queries(None))
+
+    def test_compare_flags_regressions(self):
+        """Рост задержки и числа запросов, падение пропускной
+        способности сверх допуска — регрессии; улучшения — нет."""
+        baseline = {'index': {
+            'p95_ms': 100, 'queries_per_request': 4, 'throughput_rps': 50,
+        }}
+        results = {'index': {
+            'p95_ms': 150, 'queries_per_request': 4, 'throughput_rps': 60,
+        }, 'new_view': {'p95_ms': 10}}
+        rows = compare(results, baseline, tolerance=0.1)
+        regressed = {metric for metric, *_, flag in rows['index'] if flag}
+        self.assertEqual(regressed, {'p95_ms'})
+        self.assertNotIn('new_view', rows)
+
+
+class MediaViewTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def get(self, name):
+        path = os.path.join(self.root, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'data')
+        request = RequestFactory().get('/media/' + name)
+        return media(request, name, document_root=self.root)
+
+    def test_content_addressed_files_are_immutable(self):
+        digest = 'ab' * 32
+        response = self.get(f'posts/ab/ab/{digest}.jpg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_named_files_revalidated(self):
+        response = self.get('posts/photo.jpg')
+        self.assertFalse(response.has_header('Cache-Control'))
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+_local = threading.local()
+
+
+class RequestTimings:
+    """Время и счётчики одного запроса; всё время — в секундах."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_name = None
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.template_time = 0.0
+        self.cache = {'hit': 0, 'stale': 0, 'miss': 0}
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: время каждого SQL-запроса.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.db_queries += 1
+
+
+def start_request():
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def finish_request():
+    _local.timings = None
+
+
+def current():
+    """Замеры текущего запроса или None вне запроса (команды, тесты)."""
+    return getattr(_local, 'timings', None)
+
+
+def record_cache(outcome):
+    """Учитывает обращение к кэшу: 'hit', 'stale' или 'miss'."""
+    timings = current()
+    if timings is not None:
+        timings.cache[outcome] += 1
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = current()
+        if timings is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонный бэкенд Django, который учитывает время рендеринга.
+
+    Замеряются шаблоны, которые рендерят view (render, render_to_string);
+    {% include %} внутри них входит во время внешнего шаблона.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(
+            super().from_string(template_code).template, self
+        )
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self
+        )
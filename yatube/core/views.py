@@ -1,4 +1,13 @@
+import hmac
+import re
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+from . import metrics as request_metrics
 
 
 def page_not_found(request, exception):
@@ -15,3 +24,42 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics(request):
+    """Метрики запросов в формате Prometheus.
+
+    Доступны только с токеном METRICS_TOKEN в заголовке Authorization:
+    адрес клиента за обратным прокси всегда адрес прокси, поэтому
+    по нему доступ не проверяется. Снаружи /metrics закрывают на прокси.
+    """
+    token = settings.METRICS_TOKEN
+    if not token or not hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', '').encode(),
+        f'Bearer {token}'.encode(),
+    ):
+        raise Http404
+    return HttpResponse(
+        request_metrics.render(request_metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+def media(request, path, document_root=None):
+    """Файлы MEDIA_ROOT при DEBUG.
+
+    Файлы из MEDIA_IMMUTABLE_PATTERNS браузер может не перепроверять:
+    по тому же адресу всегда то же содержимое.
+    """
+    response = serve(request, path, document_root=document_root)
+    if any(
+        re.match(pattern, path)
+        for pattern in settings.MEDIA_IMMUTABLE_PATTERNS
+    ):
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.MEDIA_IMMUTABLE_MAX_AGE,
+            immutable=True,
+        )
+    return response
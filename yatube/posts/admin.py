@@ -1,6 +1,8 @@
 from django.contrib import admin
 
 from posts.models import Group, Post, Comment, Follow, PostImage
+from posts.search import (build_match, filter_matching_posts,
+                          search_available)
 
 class PostImageInline(admin.TabularInline):
     model = PostImage
@@ -21,6 +23,14 @@ class PostAdmin(admin.ModelAdmin):
         PostImageInline,
     ]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по FTS5-индексу вместо LIKE '%...%' по всей таблице.
+        if not search_available() or not build_match(search_term):
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return filter_matching_posts(queryset, search_term), False
+
 
 
 
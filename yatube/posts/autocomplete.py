@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.urls import reverse
+
+from .models import AutocompleteTerm
+
+# Больше любого символа Юникода: prefix + TERM_END — верхняя граница
+# диапазона ключей, начинающихся с prefix.
+TERM_END = '\U0010ffff'
+TERM_MAX_LENGTH = AutocompleteTerm._meta.get_field('term').max_length
+# Один объект может совпасть с префиксом несколькими ключами
+# (slug и название группы), поэтому строк читается с запасом.
+TERMS_PER_OBJECT = 4
+
+OBJECT_URLS = {
+    AutocompleteTerm.USER: 'posts:profile',
+    AutocompleteTerm.GROUP: 'posts:group_list',
+}
+
+
+def make_terms(*texts):
+    """Ключи индекса для строк texts: каждая строка и каждое её слово."""
+    terms = set()
+    for text in texts:
+        text = text.lower()
+        terms.add(text)
+        terms.update(text.split())
+    return {term[:TERM_MAX_LENGTH] for term in terms if term}
+
+
+def _replace_terms(kind, object_id, value, label, *texts):
+    AutocompleteTerm.objects.filter(kind=kind, object_id=object_id).delete()
+    AutocompleteTerm.objects.bulk_create(
+        AutocompleteTerm(
+            term=term, kind=kind, object_id=object_id,
+            value=value, label=label
+        ) for term in make_terms(*texts)
+    )
+
+
+def index_user(user):
+    if not user.is_active:
+        drop_terms(AutocompleteTerm.USER, user.pk)
+        return
+    _replace_terms(
+        AutocompleteTerm.USER, user.pk, user.username,
+        user.get_full_name() or user.username, user.username
+    )
+
+
+def index_group(group):
+    _replace_terms(
+        AutocompleteTerm.GROUP, group.pk, group.slug, group.title,
+        group.slug, group.title
+    )
+
+
+def drop_terms(kind, object_id):
+    AutocompleteTerm.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def complete(prefix, limit):
+    """Пользователи и группы, ключ которых начинается с prefix.
+
+    Диапазон term >= prefix AND term < prefix + TERM_END читается
+    по индексу; startswith для SQLite дал бы LIKE ... ESCAPE,
+    который индекс не использует.
+    """
+    prefix = prefix.strip().lower()
+    if not prefix:
+        return []
+    rows = AutocompleteTerm.objects.filter(
+        term__gte=prefix, term__lt=prefix + TERM_END
+    ).order_by('term').values_list(
+        'kind', 'object_id', 'value', 'label'
+    )[:limit * TERMS_PER_OBJECT]
+    results = {}
+    for kind, object_id, value, label in rows:
+        if (kind, object_id) in results:
+            continue
+        results[kind, object_id] = {
+            'type': kind,
+            'label': label,
+            'url': reverse(OBJECT_URLS[kind], args=[value]),
+        }
+        if len(results) == limit:
+            break
+    return list(results.values())
+
+
+def autocomplete_limit(value):
+    """Число подсказок из ?limit=, не больше AUTOCOMPLETE_LIMIT."""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return settings.AUTOCOMPLETE_LIMIT
+    return max(1, min(limit, settings.AUTOCOMPLETE_LIMIT))
@@ -0,0 +1,86 @@
+from django.db.models import Max, Min
+from django.urls import reverse
+
+from .models import Follow, Group, Post, User
+
+# Сколько объектов каждого вида берётся из базы для запросов.
+SAMPLE_SIZE = 1000
+
+
+def _sample_ids(model, rng, size):
+    """Случайные существующие id без ORDER BY RANDOM() по всей таблице:
+    берутся случайные числа из диапазона id, пропуски отбрасываются."""
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    span = range(bounds['low'], bounds['high'] + 1)
+    candidates = rng.sample(span, min(size, len(span)))
+    return list(
+        model.objects.filter(pk__in=candidates).values_list('pk', flat=True)
+    )
+
+
+class Targets:
+    """Посты, авторы, группы и читатели, к которым обращаются сценарии."""
+
+    def __init__(self, rng, size=SAMPLE_SIZE):
+        self.post_ids = _sample_ids(Post, rng, size)
+        self.usernames = list(User.objects.filter(
+            pk__in=_sample_ids(User, rng, size)
+        ).values_list('username', flat=True))
+        self.groups = list(Group.objects.values_list('pk', 'slug')[:size])
+        # Читатели с подписками: их лента не пуста.
+        self.reader_ids = list(Follow.objects.filter(
+            pk__in=_sample_ids(Follow, rng, size)
+        ).values_list('user_id', flat=True).distinct()) or self.author_ids()
+
+    def author_ids(self):
+        return list(User.objects.filter(
+            username__in=self.usernames
+        ).values_list('pk', flat=True))
+
+    def reader(self, rng):
+        return User.objects.get(pk=rng.choice(self.reader_ids))
+
+    def index(self, rng):
+        return 'GET', reverse('posts:index'), {}
+
+    def group_list(self, rng):
+        pk, slug = rng.choice(self.groups)
+        return 'GET', reverse('posts:group_list', args=[slug]), {}
+
+    def profile(self, rng):
+        username = rng.choice(self.usernames)
+        return 'GET', reverse('posts:profile', args=[username]), {}
+
+    def post_detail(self, rng):
+        post_id = rng.choice(self.post_ids)
+        return 'GET', reverse('posts:post_detail', args=[post_id]), {}
+
+    def follow_index(self, rng):
+        return 'GET', reverse('posts:follow_index'), {}
+
+    def post_create(self, rng):
+        data = {'text': f'Пост нагрузочного теста {rng.random()}'}
+        if self.groups:
+            data['group'] = rng.choice(self.groups)[0]
+        return 'POST', reverse('posts:post_create'), data
+
+    def add_comment(self, rng):
+        post_id = rng.choice(self.post_ids)
+        return 'POST', reverse('posts:add_comment', args=[post_id]), {
+            'text': f'Комментарий нагрузочного теста {rng.random()}'
+        }
+
+
+# Сценарии в порядке прогона: сначала чтение, затем запись,
+# чтобы новые посты не меняли результаты чтения.
+SCENARIOS = (
+    'index',
+    'group_list',
+    'profile',
+    'post_detail',
+    'follow_index',
+    'post_create',
+    'add_comment',
+)
@@ -0,0 +1,282 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from core.timing import record_cache
+
+from .models import Post
+
+GENERATION_KEY = 'generation:{}'
+# Поколение, общее для всех страниц: меняется вместе с группами.
+GLOBAL_SCOPE = 'all'
+LOCK_KEY = 'lock:{}'
+LOCK_POLL_INTERVAL = 0.05
+# Бэкенды, которые хранят кэш в памяти одного процесса.
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def _initial_generation():
+    # Начинаем со времени в миллисекундах: если ключ поколения вытеснят
+    # из кэша, новое значение не совпадёт ни с одним из прежних.
+    return int(time.time() * 1000)
+
+
+def _generation_timeout():
+    """Срок жизни номеров поколений.
+
+    В общем кэше они хранятся бессрочно. Локальный кэш у каждого
+    процесса свой, и смену поколения в одном процессе другие
+    не увидят, поэтому там поколения истекают через
+    PAGE_CACHE_LOCAL_TIMEOUT: с новым поколением страницы, фрагменты
+    и ETag пересобираются, и устаревшая копия живёт не дольше этого.
+    """
+    if settings.CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS:
+        return settings.PAGE_CACHE_LOCAL_TIMEOUT
+    return None
+
+
+def get_generations(scopes):
+    """Текущие номера поколений для областей scopes."""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    missing = {
+        key: _initial_generation() for key in keys if key not in generations
+    }
+    if missing:
+        cache.set_many(missing, _generation_timeout())
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+def bump_generation(*scopes):
+    """Делает устаревшими все страницы, закэшированные для scopes."""
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), _generation_timeout())
+
+
+def invalidate_post_pages(post, *group_slugs):
+    """Меняет поколения страниц, на которых виден пост."""
+    slugs = set(group_slugs)
+    if post.group_id:
+        slugs.add(post.group.slug)
+    bump_generation(
+        'index',
+        f'profile:{post.author.username}',
+        f'post:{post.pk}',
+        *(f'group:{slug}' for slug in slugs if slug)
+    )
+
+
+def touch_post(post):
+    """Сдвигает дату изменения поста и сбрасывает его страницы:
+    дата входит в ключ кэша карточки поста."""
+    Post.objects.filter(pk=post.pk).update(updated=timezone.now())
+    invalidate_post_pages(post)
+
+
+def _is_fresh(entry, version):
+    """Запись свежая, если её версия актуальна и срок не вышел.
+
+    При PAGE_CACHE_EARLY_RECOMPUTE_BETA > 0 срок случайно «сдвигается»
+    вперёд пропорционально времени пересчёта (XFetch), и запись
+    обновляется чуть раньше, чем истечёт у всех одновременно.
+    """
+    if entry['version'] != version:
+        return False
+    now = time.time()
+    beta = settings.PAGE_CACHE_EARLY_RECOMPUTE_BETA
+    if beta:
+        now -= entry['delta'] * beta * math.log(1.0 - random.random())
+    return now < entry['expires']
+
+
+def _recompute(key, compute, timeout, version, cacheable):
+    started = time.time()
+    value = compute()
+    if cacheable(value):
+        entry = {
+            'value': value,
+            'version': version,
+            'expires': time.time() + timeout,
+            'delta': time.time() - started,
+        }
+        cache.set(key, entry, timeout + settings.PAGE_CACHE_STALE_TIMEOUT)
+    return value
+
+
+def get_or_recompute(key, compute, timeout, version=None,
+                     cacheable=lambda value: True):
+    """Значение из кэша с защитой от одновременного пересчёта.
+
+    Устаревшую запись (вышел срок или сменилась версия) пересчитывает
+    только процесс, захвативший блокировку в кэше; остальные в это время
+    отдают устаревшую копию. Если копии нет вовсе, они недолго ждут
+    результата и лишь затем считают сами.
+    """
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry, version):
+        record_cache('hit')
+        return entry['value']
+    lock_key = LOCK_KEY.format(key)
+    if cache.add(lock_key, 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+        record_cache('miss')
+        try:
+            return _recompute(key, compute, timeout, version, cacheable)
+        finally:
+            cache.delete(lock_key)
+    if entry is not None:
+        record_cache('stale')
+        return entry['value']
+    deadline = time.time() + settings.PAGE_CACHE_LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == version:
+            record_cache('hit')
+            return entry['value']
+    record_cache('miss')
+    return _recompute(key, compute, timeout, version, cacheable)
+
+
+def _path_hash(request):
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+def render_cached(request, name, scopes, template_name, get_context,
+                  timeout):
+    """Фрагмент страницы, общий для всех пользователей.
+
+    Шаблон рендерится без request и контекст-процессоров, поэтому
+    в нём не должно быть ничего, что зависит от пользователя;
+    get_context вызывается только при пересборке фрагмента.
+    Персональные части (шапка, кнопки, формы) рендерятся вокруг
+    фрагмента на каждом запросе.
+    """
+    names = [GLOBAL_SCOPE] + list(scopes)
+    fragment = get_or_recompute(
+        'fragment:{}:{}'.format(name, _path_hash(request)),
+        lambda: render_to_string(template_name, get_context()),
+        timeout,
+        version=get_generations(names),
+    )
+    return mark_safe(fragment)
+
+
+def _etag(request, *parts):
+    """ETag страницы: данные плюс её владелец.
+
+    Шапка у каждого своя, а формы содержат токен под CSRF-cookie,
+    поэтому пользователь и его cookie входят в ETag.
+    """
+    if request.user.is_authenticated:
+        csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+        parts += (request.user.pk, csrf)
+    raw = ':'.join(str(part) for part in parts)
+    return '"{}"'.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def generation_etag(*scopes):
+    """etag_func для django.views.decorators.http.condition.
+
+    Валидатор собирается из поколений данных страницы — их и так
+    поддерживают сигналы, и чтение из кэша не трогает базу.
+    """
+    def etag_func(request, *args, **kwargs):
+        names = [GLOBAL_SCOPE] + [
+            scope.format(**kwargs) for scope in scopes
+        ]
+        return _etag(request, *get_generations(names))
+    return etag_func
+
+
+def post_etag(request, post_id):
+    """ETag страницы поста по дате правки, денормализованным счётчикам
+    и поколению поста, которое меняет и правка комментариев.
+
+    Одно чтение по первичному ключу, без загрузки комментариев.
+    """
+    row = Post.objects.filter(pk=post_id).values_list(
+        'updated', 'comments_count', 'author__stats__posts_count'
+    ).first()
+    if row is None:
+        return None
+    generations = get_generations([GLOBAL_SCOPE, f'post:{post_id}'])
+    return _etag(request, *generations, *row)
+
+
+def _freeze(response):
+    return {
+        'content': response.content,
+        'status': response.status_code,
+        'headers': dict(response.items()),
+    }
+
+
+def _thaw(frozen):
+    response = HttpResponse(frozen['content'], status=frozen['status'])
+    for header, value in frozen['headers'].items():
+        response[header] = value
+    return response
+
+
+def _is_cacheable(frozen):
+    return frozen is not None
+
+
+def cache_anonymous_page(timeout, *scopes):
+    """Кэширует страницу целиком для анонимных посетителей.
+
+    Им всем отдаётся одна и та же страница; вошедшие пользователи
+    получают страницу, собранную из кэшированных фрагментов
+    (render_cached) и персональной шапки.
+    scopes — шаблоны областей, которые подставляются из аргументов
+    view, например 'group:{slug}'. Изменение данных области меняет
+    её поколение, и страница пересобирается при следующем запросе,
+    поэтому timeout может быть долгим (с локальным кэшем его
+    ограничивает срок жизни поколений). Пересборку выполняет один
+    процесс, остальные тем временем отдают прежнюю копию.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            names = [GLOBAL_SCOPE] + [
+                scope.format(**kwargs) for scope in scopes
+            ]
+            rendered = []
+
+            def compute():
+                response = view(request, *args, **kwargs)
+                rendered.append(response)
+                # Ответы с cookie и не 200 не кэшируем.
+                if response.status_code != 200 or response.cookies:
+                    return None
+                return _freeze(response)
+
+            frozen = get_or_recompute(
+                'page:{}:{}'.format(view.__name__, _path_hash(request)),
+                compute,
+                timeout,
+                version=get_generations(names),
+                cacheable=_is_cacheable,
+            )
+            if rendered:
+                return rendered[0]
+            return _thaw(frozen)
+        return wrapper
+    return decorator
@@ -0,0 +1,126 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import (AuthorStats, Comment, Follow, MediaBlob, Post,
+                     PostImage, User)
+
+
+def get_stats(user):
+    """Счётчики пользователя; без единой записи — нулевые."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(author=user)
+
+
+def _actual_counts(author_id):
+    return {
+        'posts_count': Post.objects.filter(author_id=author_id).count(),
+        'followers_count': Follow.objects.filter(
+            author_id=author_id
+        ).count(),
+        'following_count': Follow.objects.filter(user_id=author_id).count(),
+    }
+
+
+def change_author_stats(author_id, **deltas):
+    """Сдвигает счётчики автора F-выражением, без чтения строки."""
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if AuthorStats.objects.filter(author_id=author_id).update(**changes):
+        return
+    # Уменьшать нечего: строки нет, или её только что удалило каскадное
+    # удаление пользователя, и новая нарушила бы внешний ключ.
+    if any(delta < 0 for delta in deltas.values()):
+        return
+    # Первая активность пользователя: заводим строку с точными значениями,
+    # которые уже учитывают только что сохранённую запись.
+    stats, created = AuthorStats.objects.get_or_create(
+        author_id=author_id, defaults=_actual_counts(author_id)
+    )
+    if not created:
+        AuthorStats.objects.filter(author_id=author_id).update(**changes)
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def change_media_refs(name, delta):
+    """Сдвигает счётчик ссылок на файл name в хранилище картинок."""
+    if not name:
+        return
+    blobs = MediaBlob.objects.filter(name=name)
+    if blobs.update(refcount=F('refcount') + delta):
+        return
+    # Первая ссылка на новый файл; строку могли завести параллельно.
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name)], ignore_conflicts=True
+    )
+    blobs.update(refcount=F('refcount') + delta)
+
+
+def _count(queryset, outer_field):
+    """Подзапрос COUNT(*) по строкам queryset, связанным с внешней строкой."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{outer_field: OuterRef('pk')}).order_by()
+            .values(outer_field).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def _fix(queryset, field, actual):
+    """Переписывает только разошедшиеся значения, возвращает их число."""
+    return queryset.annotate(actual=actual).exclude(
+        **{field: F('actual')}
+    ).update(**{field: actual})
+
+
+def reconcile_counters():
+    """Пересчитывает все счётчики по базе; возвращает число исправлений
+    по каждому полю."""
+    AuthorStats.objects.bulk_create(
+        [
+            AuthorStats(author_id=pk) for pk in User.objects.filter(
+                stats__isnull=True
+            ).values_list('pk', flat=True).iterator()
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    MediaBlob.objects.bulk_create(
+        [
+            MediaBlob(name=name) for name in PostImage.objects.exclude(
+                image__in=MediaBlob.objects.values('name')
+            ).exclude(image='').exclude(image__isnull=True).order_by()
+            .values_list('image', flat=True).distinct().iterator()
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    stats = AuthorStats.objects.all()
+    return {
+        'posts_count': _fix(
+            stats, 'posts_count', _count(Post.objects.all(), 'author')
+        ),
+        'followers_count': _fix(
+            stats, 'followers_count', _count(Follow.objects.all(), 'author')
+        ),
+        'following_count': _fix(
+            stats, 'following_count', _count(Follow.objects.all(), 'user')
+        ),
+        'comments_count': _fix(
+            Post.objects.all(),
+            'comments_count',
+            _count(Comment.objects.all(), 'post'),
+        ),
+        'refcount': _fix(
+            MediaBlob.objects.all(),
+            'refcount',
+            _count(PostImage.objects.all(), 'image'),
+        ),
+    }
@@ -0,0 +1,358 @@
+import io
+import random
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from .autocomplete import make_terms
+from .caching import bump_generation, GLOBAL_SCOPE
+from .counters import reconcile_counters
+from .feed import materialize_feeds
+from .models import (AutocompleteTerm, Comment, Follow, Group, Post,
+                     PostImage, User)
+from .search import drop_search_triggers, rebuild_search_index
+from .storage import content_storage
+
+# Тексты собираются из заранее сгенерированных фраз: Faker на каждый
+# из миллионов постов работал бы дольше самой вставки.
+TEXT_POOL_SIZE = 1000
+NAME_POOL_SIZE = 500
+# Посты ссылаются на небольшой набор общих файлов картинок.
+IMAGE_POOL_SIZE = 20
+IMAGE_SIZE = (960, 540)
+# Доля постов, опубликованных в группах.
+GROUP_SHARE = 0.7
+# Наибольшая задержка комментария после публикации поста.
+COMMENT_DELAY = timedelta(days=7)
+# Поля, которые заполняет _insert_rows, в порядке значений строки.
+POST_FIELDS = ('id', 'text', 'author', 'group', 'created', 'updated',
+               'comments_count')
+COMMENT_FIELDS = ('id', 'post', 'author', 'text', 'created')
+FOLLOW_FIELDS = ('id', 'user', 'author')
+
+
+def _popularity(count, exponent):
+    """Накопленные веса закона Ципфа для рангов 1..count: объект ранга r
+    выбирается с вероятностью, пропорциональной 1 / r ** exponent."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+def _max_id(model):
+    return model.objects.aggregate(top=Max('pk'))['top'] or 0
+
+
+@contextmanager
+def _bulk_load():
+    """SQLite без fsync и без триггеров поискового индекса;
+    индекс строится заново после загрузки."""
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    # Внутри транзакции (например, в тестах) режим записи не меняется.
+    pragma = not connection.in_atomic_block
+    if pragma:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            synchronous = cursor.fetchone()[0]
+            cursor.execute('PRAGMA synchronous = OFF')
+    drop_search_triggers(connection)
+    try:
+        yield
+    finally:
+        rebuild_search_index(connection)
+        if pragma:
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA synchronous = {synchronous}')
+
+
+def _insert_rows(model, fields, rows):
+    """Вставляет кортежи значений полей fields одним executemany.
+
+    bulk_create тратит на каждую строку больше времени, чем сама
+    вставка: создаёт объект модели и готовит каждое значение. Для
+    таблиц на миллионы строк значения готовятся заранее.
+    """
+    if not rows:
+        return 0
+    columns = ', '.join(
+        connection.ops.quote_name(model._meta.get_field(name).column)
+        for name in fields
+    )
+    placeholders = ', '.join(['%s'] * len(fields))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {model._meta.db_table} ({columns}) '
+            f'VALUES ({placeholders})',
+            rows
+        )
+    return len(rows)
+
+
+def _reset_sequences(*models):
+    # id задаются явно; на PostgreSQL последовательности нужно догнать.
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+class DatasetGenerator:
+    """Синтетические данные для нагрузочного тестирования.
+
+    Строки пишутся пачками по batch_size с заранее назначенными id,
+    поэтому связи между пачками известны без чтения из базы. Посты,
+    комментарии и подписки вставляются через _insert_rows, остальное —
+    bulk_create. Подписчики и посты распределены по закону Ципфа: немногие
+    авторы собирают большую часть подписок. При одном seed набор
+    данных повторяется (кроме дат, которые отсчитываются от текущего
+    времени). Сигналы при массовой вставке не срабатывают: счётчики,
+    ленты, индексы поиска и автодополнения заполняются отдельно.
+    """
+
+    def __init__(self, seed=0, batch_size=10000, days=365,
+                 exponent=1.0, password='password', locale='ru_RU',
+                 log=print):
+        self.random = random.Random(seed)
+        self.faker = Faker(locale)
+        self.faker.seed_instance(seed)
+        self.seed = seed
+        self.batch_size = batch_size
+        self.exponent = exponent
+        self.password = password
+        self.log = log
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.user_ids = []
+        self.group_ids = []
+
+    def _pool(self, factory, size):
+        return [factory() for _ in range(size)]
+
+    def _batches(self, total):
+        for first in range(0, total, self.batch_size):
+            yield first, min(self.batch_size, total - first)
+
+    def _popular(self, ids):
+        # Ранги популярности не совпадают с порядком id.
+        ids = ids[:]
+        self.random.shuffle(ids)
+        return ids, _popularity(len(ids), self.exponent)
+
+    def _pick(self, ids, weights, count):
+        return [
+            ids[bisect_left(weights, self.random.random() * weights[-1])]
+            for _ in range(count)
+        ]
+
+    def _timed(self, name, method, *args):
+        started = time.monotonic()
+        count = method(*args)
+        duration = time.monotonic() - started
+        rate = count / duration if duration else count
+        self.log(f'{name}: {count} за {duration:.1f} с ({rate:.0f}/с)')
+        return count
+
+    def generate(self, users, groups, posts, comments, follows, images):
+        with _bulk_load():
+            self._timed('Пользователи', self.create_users, users)
+            self._timed('Группы', self.create_groups, groups)
+            first_follow_id = _max_id(Follow) + 1
+            self._timed('Подписки', self.create_follows, follows)
+            self._timed('Посты', self.create_posts, posts, comments, images)
+            _reset_sequences(User, Group, Post, Comment, Follow)
+        self._timed('Счётчики', lambda: sum(reconcile_counters().values()))
+        self._timed('Ленты', materialize_feeds, first_follow_id)
+        bump_generation(GLOBAL_SCOPE)
+
+    def create_users(self, count):
+        first_names = self._pool(self.faker.first_name, NAME_POOL_SIZE)
+        last_names = self._pool(self.faker.last_name, NAME_POOL_SIZE)
+        logins = self._pool(self.faker.user_name, NAME_POOL_SIZE)
+        # Один хеш на всех: хеширование пароля дольше вставки строки.
+        password = make_password(self.password)
+        first_id = _max_id(User) + 1
+        for first, size in self._batches(count):
+            users, terms = [], []
+            for pk in range(first_id + first, first_id + first + size):
+                user = User(
+                    pk=pk,
+                    username=f'{self.random.choice(logins)}_{pk}',
+                    first_name=self.random.choice(first_names),
+                    last_name=self.random.choice(last_names),
+                    password=password,
+                    date_joined=self.start,
+                )
+                users.append(user)
+                terms += [
+                    AutocompleteTerm(
+                        term=term, kind=AutocompleteTerm.USER,
+                        object_id=pk, value=user.username,
+                        label=user.get_full_name() or user.username
+                    ) for term in make_terms(user.username)
+                ]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                AutocompleteTerm.objects.bulk_create(terms)
+            self.user_ids += [user.pk for user in users]
+        return count
+
+    def create_groups(self, count):
+        first_id = _max_id(Group) + 1
+        groups = [
+            Group(
+                pk=pk,
+                title=self.faker.catch_phrase(),
+                slug=f'group-{pk}',
+                description=self.faker.paragraph(),
+            ) for pk in range(first_id, first_id + count)
+        ]
+        with transaction.atomic():
+            Group.objects.bulk_create(groups)
+            AutocompleteTerm.objects.bulk_create(
+                AutocompleteTerm(
+                    term=term, kind=AutocompleteTerm.GROUP,
+                    object_id=group.pk, value=group.slug,
+                    label=group.title
+                )
+                for group in groups
+                for term in make_terms(group.slug, group.title)
+            )
+        self.group_ids = [group.pk for group in groups]
+        return count
+
+    def create_follows(self, count):
+        """Подписки: число подписок пользователя распределено
+        экспоненциально со средним count / users, автор выбирается
+        по популярности — число подписчиков следует закону Ципфа."""
+        if len(self.user_ids) < 2 or not count:
+            return 0
+        authors, weights = self._popular(self.user_ids)
+        mean = count / len(self.user_ids)
+        limit = len(self.user_ids) // 2
+        pk = _max_id(Follow) + 1
+        created, rows = 0, []
+        for user_id in self.user_ids:
+            wanted = min(round(self.random.expovariate(1 / mean)), limit)
+            chosen = set()
+            # Популярных авторов выбирают чаще; попыток — с запасом.
+            for _ in range(wanted * 3):
+                if len(chosen) == wanted:
+                    break
+                author_id = self._pick(authors, weights, 1)[0]
+                if author_id != user_id:
+                    chosen.add(author_id)
+            for author_id in sorted(chosen):
+                rows.append((pk, user_id, author_id))
+                pk += 1
+            if len(rows) >= self.batch_size:
+                created += _insert_rows(Follow, FOLLOW_FIELDS, rows)
+                rows = []
+        return created + _insert_rows(Follow, FOLLOW_FIELDS, rows)
+
+    def create_posts(self, count, comments, images):
+        """Посты с комментариями и картинками.
+
+        Даты постов равномерно растут с id от start до now. Комментарии
+        и картинки делятся между пачками пропорционально числу постов
+        и ссылаются на посты своей пачки.
+        """
+        if not self.user_ids or not count:
+            return 0
+        # Картинка бывает не больше чем у каждого поста.
+        images = min(images, count)
+        phrases = self._pool(self.faker.sentence, TEXT_POOL_SIZE)
+        authors, weights = self._popular(self.user_ids)
+        groups, group_weights = self._popular(self.group_ids)
+        files = self.create_image_files(min(images, IMAGE_POOL_SIZE))
+        step = (self.now - self.start) / count
+        first_id = _max_id(Post) + 1
+        comment_id = _max_id(Comment) + 1
+        comments_done = images_done = 0
+        adapt = connection.ops.adapt_datetimefield_value
+        for first, size in self._batches(count):
+            done = first + size
+            dates = [self.start + step * number
+                     for number in range(first, done)]
+            post_comments = []
+            for _ in range(comments * done // count - comments_done):
+                index = self.random.randrange(size)
+                post_comments.append((
+                    comment_id,
+                    first_id + first + index,
+                    self.random.choice(self.user_ids),
+                    self.random.choice(phrases),
+                    adapt(min(
+                        dates[index] + COMMENT_DELAY * self.random.random(),
+                        self.now
+                    )),
+                ))
+                comment_id += 1
+            comments_done += len(post_comments)
+            per_post = Counter(row[1] for row in post_comments)
+            posts = []
+            for index, author_id in enumerate(
+                self._pick(authors, weights, size)
+            ):
+                pk = first_id + first + index
+                group_id = None
+                if groups and self.random.random() < GROUP_SHARE:
+                    group_id = self._pick(groups, group_weights, 1)[0]
+                created = adapt(dates[index])
+                text = ' '.join(
+                    self.random.choices(phrases, k=self.random.randint(1, 4))
+                )
+                posts.append((
+                    pk, text, author_id, group_id, created, created,
+                    per_post[pk]
+                ))
+            with_images = self.random.sample(
+                range(size), images * done // count - images_done
+            ) if files else []
+            images_done += len(with_images)
+            with transaction.atomic():
+                _insert_rows(Post, POST_FIELDS, posts)
+                _insert_rows(Comment, COMMENT_FIELDS, post_comments)
+                PostImage.objects.bulk_create(
+                    PostImage(
+                        post_id=first_id + first + index,
+                        image=self.random.choice(files)
+                    ) for index in with_images
+                )
+        return count
+
+    def create_image_files(self, count):
+        """Несколько картинок-заглушек в хранилище; имена файлов."""
+        names = []
+        for number in range(count):
+            image = Image.new('RGB', IMAGE_SIZE, self._color())
+            draw = ImageDraw.Draw(image)
+            for _ in range(8):
+                x, y = (self.random.randrange(side) for side in IMAGE_SIZE)
+                draw.ellipse(
+                    (x, y, x + IMAGE_SIZE[1] // 3, y + IMAGE_SIZE[1] // 3),
+                    fill=self._color()
+                )
+            content = io.BytesIO()
+            image.save(content, 'JPEG', quality=80)
+            names.append(content_storage.save(
+                f'posts/dataset_{self.seed}_{number}.jpg',
+                ContentFile(content.getvalue())
+            ))
+        return names
+
+    def _color(self):
+        return tuple(self.random.randrange(256) for _ in range(3))
@@ -0,0 +1,190 @@
+import logging
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from .models import AuthorStats, FeedItem, Follow, Post
+
+logger = logging.getLogger(__name__)
+
+# Порядок ленты подписок совпадает с индексом feed_user_created_idx.
+FOLLOW_FEED_ORDERING = ('-feed_created', '-feed_post')
+FEED_BATCH_SIZE = 500
+
+
+def _bulk_insert(items):
+    """Вставляет записи ленты пачками, не собирая их все в память."""
+    items = iter(items)
+    inserted = 0
+    batch = list(islice(items, FEED_BATCH_SIZE))
+    while batch:
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+        inserted += len(batch)
+        batch = list(islice(items, FEED_BATCH_SIZE))
+    return inserted
+
+
+def is_celebrity(author_id):
+    """Автор со множеством подписчиков: его посты не раскладываются
+    по лентам, а подмешиваются в ленту при чтении."""
+    return AuthorStats.objects.filter(
+        author_id=author_id,
+        followers_count__gte=settings.FEED_CELEBRITY_THRESHOLD
+    ).exists()
+
+
+def _followers_count(author_id):
+    return AuthorStats.objects.filter(
+        author_id=author_id
+    ).values_list('followers_count', flat=True).first() or 0
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    started = time.monotonic()
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    inserted = _bulk_insert(
+        FeedItem(user_id=user_id, post=post, created=post.created)
+        for user_id in followers.iterator()
+    )
+    logger.info(
+        'fan-out post=%s author=%s feeds=%s duration=%.4fs',
+        post.pk, post.author_id, inserted, time.monotonic() - started
+    )
+
+
+def materialize_feeds(first_follow_id):
+    """Раскладывает по лентам все посты авторов из подписок
+    с id >= first_follow_id одним INSERT ... SELECT.
+
+    Для массовой загрузки: bulk_create не вызывает сигналов, которые
+    делают это для каждого поста. Счётчики подписчиков (AuthorStats)
+    к этому моменту должны быть сверены.
+    """
+    tables = {
+        model.__name__.lower(): model._meta.db_table
+        for model in (AuthorStats, FeedItem, Follow, Post)
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """INSERT INTO {feeditem} (user_id, post_id, created)
+            SELECT follow.user_id, post.id, post.created
+            FROM {follow} AS follow
+            JOIN {post} AS post ON post.author_id = follow.author_id
+            LEFT JOIN {authorstats} AS stats
+                ON stats.author_id = follow.author_id
+            WHERE follow.id >= %s
+                AND COALESCE(stats.followers_count, 0) < %s""".format(
+                **tables
+            ),
+            [first_follow_id, settings.FEED_CELEBRITY_THRESHOLD],
+        )
+        return cursor.rowcount
+
+
+def materialize_author_feeds(author_id):
+    """Заново раскладывает последние посты автора по лентам
+    всех его подписчиков одним INSERT ... SELECT.
+
+    Для автора, который перестал быть популярным: пока он им был,
+    его посты не раскладывались, а часть подписчиков подписалась
+    без заполнения ленты.
+    """
+    FeedItem.objects.filter(post__author_id=author_id).delete()
+    tables = {
+        model.__name__.lower(): model._meta.db_table
+        for model in (FeedItem, Follow, Post)
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """INSERT INTO {feeditem} (user_id, post_id, created)
+            SELECT follow.user_id, post.id, post.created
+            FROM {follow} AS follow, (
+                SELECT id, created FROM {post}
+                WHERE author_id = %s
+                ORDER BY created DESC, id DESC
+                LIMIT %s
+            ) AS post
+            WHERE follow.author_id = %s""".format(**tables),
+            [author_id, settings.FEED_BACKFILL_SIZE, author_id],
+        )
+        return cursor.rowcount
+
+
+def backfill_feed(follow):
+    """Добавляет в ленту подписчика последние посты нового автора.
+
+    Если с этой подпиской автор стал популярным, его посты убираются
+    из всех лент: дальше они читаются при запросе ленты.
+    """
+    followers = _followers_count(follow.author_id)
+    if followers == settings.FEED_CELEBRITY_THRESHOLD:
+        FeedItem.objects.filter(post__author_id=follow.author_id).delete()
+    if followers >= settings.FEED_CELEBRITY_THRESHOLD:
+        return
+    posts = Post.objects.filter(
+        author_id=follow.author_id
+    ).order_by('-created').values_list('pk', 'created')
+    _bulk_insert(
+        FeedItem(user_id=follow.user_id, post_id=post_id, created=created)
+        for post_id, created in posts[:settings.FEED_BACKFILL_SIZE]
+    )
+
+
+def prune_feed(follow):
+    """Убирает из ленты посты автора, от которого отписались.
+
+    Если с этой отпиской автор перестал быть популярным, его посты
+    раскладываются по лентам оставшихся подписчиков.
+    """
+    FeedItem.objects.filter(
+        user_id=follow.user_id,
+        post__author_id=follow.author_id
+    ).delete()
+    followers = _followers_count(follow.author_id)
+    if followers == settings.FEED_CELEBRITY_THRESHOLD - 1:
+        materialize_author_feeds(follow.author_id)
+
+
+def followed_celebrities(user):
+    """id авторов из подписок пользователя, чьи посты читаются напрямую."""
+    return list(
+        AuthorStats.objects.filter(
+            author__following__user=user,
+            followers_count__gte=settings.FEED_CELEBRITY_THRESHOLD
+        ).values_list('author_id', flat=True)
+    )
+
+
+def follow_feed(user):
+    """Источники ленты подписок пользователя.
+
+    Посты обычных авторов лежат в материализованной ленте (push),
+    посты популярных авторов берутся из их постов при чтении (pull).
+    Ключи сортировки (feed_created, feed_post) у источников общие,
+    поэтому пагинатор сливает их в одну ленту.
+    """
+    sources = [
+        Post.objects.filter(feed_items__user=user).annotate(
+            feed_created=F('feed_items__created'),
+            feed_post=F('feed_items__post'),
+        ).select_related('author', 'group')
+    ]
+    # У каждого популярного автора свой источник: он читается
+    # по индексу (author, created) с LIMIT, без общей сортировки
+    # всех их постов.
+    sources.extend(
+        Post.objects.filter(author_id=author_id).annotate(
+            feed_created=F('created'),
+            feed_post=F('pk'),
+        ).select_related('author', 'group')
+        for author_id in followed_celebrities(user)
+    )
+    return sources
@@ -1,13 +1,48 @@
 from django import forms
 
-from .models import Post, Comment
+from .models import Post, Comment, PostImage
+from .uploads import check_image, downscale_image
 
 
 class PostForm(forms.ModelForm):
+    image = forms.ImageField(
+        label='Картинка',
+        required=False,
+        help_text='Загрузите картинку'
+    )
+
     class Meta:
         model = Post
         fields = ('text', 'group')
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Ошибки, найденные ImageUploadHandler ещё во время загрузки.
+        self.upload_errors = upload_errors or {}
+
+    def clean_image(self):
+        if 'image' in self.upload_errors:
+            raise forms.ValidationError(self.upload_errors['image'])
+        image = self.cleaned_data['image']
+        if not image:
+            return image
+        error = check_image(image.image.format, image.image.size)
+        if error:
+            raise forms.ValidationError(error)
+        return downscale_image(image)
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        image = self.cleaned_data.get('image')
+        if commit and image:
+            post_image = post.image.order_by('pk').first()
+            if post_image is None:
+                PostImage.objects.create(post=post, image=image)
+            else:
+                post_image.image = image
+                post_image.save()
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
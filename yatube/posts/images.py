@@ -0,0 +1,262 @@
+import math
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.engines.pil_engine import Engine as PILEngine
+from sorl.thumbnail.images import deserialize_image_file, ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDbKVStore
+)
+from sorl.thumbnail.models import KVStore
+from sorl.thumbnail.parsers import parse_geometry
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+
+
+def draft_jpeg(image, factor):
+    """Просит декодер JPEG сразу уменьшить картинку в 2–8 раз,
+    но не меньше, чем до factor от исходного размера.
+
+    Размер для draft — в пропорциях исходника: декодер берёт масштаб
+    по стороне, которой нужно больше, и с квадратной рамкой вытянутая
+    картинка декодировалась бы почти целиком.
+    """
+    if image.format != 'JPEG' or factor >= 1:
+        return
+    width, height = image.size
+    image.draft(image.mode, (
+        max(1, math.ceil(width * factor)),
+        max(1, math.ceil(height * factor)),
+    ))
+
+
+class DraftEngine(PILEngine):
+    """PIL-движок sorl, который читает JPEG в режиме draft (THUMBNAIL_ENGINE).
+
+    Большой оригинал декодируется сразу уменьшенным до размера
+    миниатюры перед обрезкой, а не целиком ради каждого варианта.
+    """
+
+    def create(self, image, geometry, options):
+        if not options.get('cropbox'):
+            width, height = map(float, self.get_image_size(image))
+            if self.flip_dimensions(image, geometry, options):
+                width, height = height, width
+            draft_jpeg(image, self._calculate_scaling_factor(
+                width, height, geometry, options
+            ))
+        return super().create(image, geometry, options)
+
+
+class Placeholder:
+    """Заглушка вместо миниатюры, которая ещё не готова:
+    размеры те же, чтобы страница не прыгала после обработки."""
+    url = ''
+    srcset = ''
+    sources = ()
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+
+class ResponsiveThumbnail:
+    """Готовые варианты миниатюры одной картинки.
+
+    url, width и height — основного варианта для <img>; srcset —
+    вариантов в формате исходной картинки, sources — вариантов
+    в других форматах для <source> внутри <picture>.
+    """
+
+    def __init__(self, fallback, by_format):
+        self.url = fallback.url
+        self.width = fallback.width
+        self.height = fallback.height
+        self.srcset = _srcset(by_format.pop(None, []))
+        self.sources = [
+            {'type': MIME_TYPES[fmt], 'srcset': _srcset(thumbnails)}
+            for fmt, thumbnails in by_format.items()
+        ]
+
+
+def _srcset(thumbnails):
+    return ', '.join(
+        f'{thumbnail.url} {thumbnail.width}w'
+        for thumbnail in sorted(thumbnails, key=lambda item: item.width)
+    )
+
+
+def thumbnail_variants(size):
+    """Варианты миниатюры size — пары (ширина, формат).
+
+    Формат None — формат исходной картинки. Первый вариант основной:
+    он попадает в src и по его размеру рисуется заглушка.
+    """
+    options = settings.POST_IMAGE_THUMBNAILS[size]
+    base_width, _ = parse_geometry(options['geometry'])
+    widths = [base_width] + [
+        width for width in options.get('widths', ()) if width != base_width
+    ]
+    return [
+        (width, fmt)
+        for fmt in (None,) + tuple(options.get('formats', ()))
+        for width in widths
+    ]
+
+
+def thumbnail_options(size, source, width=None, fmt=None):
+    """Геометрия и полные опции варианта миниатюры size.
+
+    Высота варианта — в пропорции основной геометрии. sorl строит имя
+    файла миниатюры из всех опций, включая значения по умолчанию;
+    подставляем их так же, как get_thumbnail.
+    """
+    options = dict(settings.POST_IMAGE_THUMBNAILS[size])
+    options.pop('widths', None)
+    options.pop('formats', None)
+    base_width, base_height = parse_geometry(options.pop('geometry'))
+    width = width or base_width
+    geometry = '{}x{}'.format(width, round(base_height * width / base_width))
+    backend = default.backend
+    options['format'] = fmt or backend._get_format(source)
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, name in backend.extra_options:
+        value = getattr(sorl_settings, name)
+        if value != getattr(sorl_defaults, name):
+            options.setdefault(key, value)
+    return geometry, options
+
+
+def thumbnail_file(image, size, width=None, fmt=None):
+    """Файл варианта миниатюры size картинки image, без чтения
+    и генерации; по умолчанию — основного варианта."""
+    source = ImageFile(image)
+    geometry, options = thumbnail_options(size, source, width, fmt)
+    return ImageFile(
+        default.backend._get_thumbnail_filename(source, geometry, options),
+        default.storage
+    )
+
+
+def placeholder(size):
+    width, height = parse_geometry(
+        settings.POST_IMAGE_THUMBNAILS[size]['geometry']
+    )
+    return Placeholder(width, height)
+
+
+def _get_raw_many(keys):
+    """Значения ключей хранилища sorl: один get_many к кэшу и один
+    запрос к таблице KVStore за всеми промахами."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDbKVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStore.objects.filter(key__in=missing).values_list('key', 'value')
+        )
+        # Отсутствие тоже кэшируем, как это делает сам sorl.
+        loaded = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(loaded)
+    return {
+        key: None if value == EMPTY_VALUE else value
+        for key, value in values.items()
+    }
+
+
+def ready_thumbnails(images, size):
+    """Готовые миниатюры size картинок images одним чтением хранилища.
+
+    Возвращает словарь {имя картинки: ResponsiveThumbnail}; картинок
+    без готового основного варианта в нём нет. Варианты, которых нет
+    (например, шире исходной картинки), не попадают в srcset.
+    """
+    variants = thumbnail_variants(size)
+    keys = {}
+    for image in images:
+        if not image:
+            continue
+        for variant in variants:
+            key = add_prefix(thumbnail_file(image, size, *variant).key)
+            keys[key] = (image.name, variant)
+    found = {}
+    for key, value in _get_raw_many(list(keys)).items():
+        if value:
+            name, variant = keys[key]
+            found.setdefault(name, {})[variant] = deserialize_image_file(
+                value
+            )
+    thumbnails = {}
+    for name, ready in found.items():
+        fallback = ready.get(variants[0])
+        if fallback is None:
+            continue
+        by_format = {}
+        for (width, fmt), thumbnail in ready.items():
+            by_format.setdefault(fmt, []).append(thumbnail)
+        thumbnails[name] = ResponsiveThumbnail(fallback, by_format)
+    return thumbnails
+
+
+def ready_thumbnail(image, size):
+    """Миниатюра из хранилища ключей sorl или заглушка, если её ещё нет.
+
+    В отличие от {% thumbnail %} ничего не генерирует: миниатюры делает
+    фоновый обработчик (posts.tasks).
+    """
+    if image:
+        thumbnail = ready_thumbnails([image], size).get(image.name)
+        if thumbnail is not None:
+            return thumbnail
+    return placeholder(size)
+
+
+def attach_thumbnails(page, size='card'):
+    """Картинки постов страницы одним запросом и их миниатюры одним
+    чтением хранилища sorl вместо запросов из каждой карточки.
+
+    Миниатюры сохраняются в image.thumbnails[size], их берёт
+    {% post_thumbnail %}.
+    """
+    page.object_list = list(page.object_list)
+    prefetch_related_objects(page.object_list, 'image')
+    images = [image for post in page.object_list for image in post.image.all()]
+    found = ready_thumbnails(
+        [image.image for image in images if image.thumbnails_ready], size
+    )
+    for image in images:
+        image.thumbnails = {
+            size: found.get(image.image.name) or placeholder(size)
+        }
+    return page
+
+
+def generate_thumbnails(image):
+    """Делает все варианты миниатюр из POST_IMAGE_THUMBNAILS.
+
+    Варианты шире основного и шире исходной картинки пропускаются:
+    растянутая копия только тяжелее, но не чётче.
+    """
+    for size in settings.POST_IMAGE_THUMBNAILS:
+        variants = thumbnail_variants(size)
+        base_width = variants[0][0]
+        for width, fmt in variants:
+            if width > base_width and width > image.width:
+                continue
+            geometry, options = thumbnail_options(
+                size, ImageFile(image), width, fmt
+            )
+            get_thumbnail(image, geometry, **options)
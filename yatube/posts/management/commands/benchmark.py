@@ -0,0 +1,158 @@
+import json
+import logging
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.benchmark import compare, HttpClient, InProcessClient, run_scenario
+from posts.benchmark import SCENARIOS, Targets
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон view постов: пропускная способность, '
+        'p50/p95/p99 и SQL-запросы на запрос, сравнение с базовым прогоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--views', nargs='+', choices=SCENARIOS, default=SCENARIOS,
+            help='Какие view прогонять (по умолчанию все)'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов к каждому view'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Число одновременных клиентов'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help='Запросов прогрева, не попадающих в отчёт'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера; без него запросы идут '
+                 'через тестовый клиент Django в этом процессе'
+        )
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль пользователей для входа на сервер по --url'
+        )
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Куда сохранить результаты в JSON'
+        )
+        parser.add_argument(
+            '--baseline', help='Результаты прошлого прогона для сравнения'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.1,
+            help='Допустимое ухудшение показателя, доля (0.1 — 10%%)'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        targets = Targets(rng)
+        if not targets.post_ids:
+            raise CommandError(
+                'В базе нет постов: заполните её командой generate_dataset'
+            )
+        views = options['views']
+        if not targets.groups and 'group_list' in views:
+            self.stdout.write(self.style.WARNING(
+                'Групп нет: group_list пропущен'
+            ))
+            views = [view for view in views if view != 'group_list']
+        if options['url']:
+            def make_client(rng):
+                return HttpClient(
+                    options['url'], targets.reader(rng).username,
+                    options['password']
+                )
+        else:
+            def make_client(rng):
+                return InProcessClient(targets.reader(rng))
+
+        request_logger = logging.getLogger('core.requests')
+        level = request_logger.level
+        # Строка лога на каждый запрос исказила бы замеры.
+        request_logger.setLevel(logging.WARNING)
+        try:
+            with override_settings(SERVER_TIMING_HEADER=True):
+                results = {
+                    view: self.run(view, targets, make_client, options)
+                    for view in views
+                }
+        finally:
+            request_logger.setLevel(level)
+
+        report = {
+            'meta': {
+                'time': timezone.now().isoformat(),
+                'target': options['url'] or 'in-process',
+                'database': connection.vendor,
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'seed': options['seed'],
+            },
+            'views': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты сохранены в {options["output"]}')
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['tolerance'])
+
+    def run(self, view, targets, make_client, options):
+        stats = run_scenario(
+            getattr(targets, view), make_client,
+            options['requests'], options['concurrency'],
+            options['warmup'], options['seed'],
+        )
+        self.stdout.write(
+            '{:<13} {:>8} rps  p50 {:>8} мс  p95 {:>8} мс  p99 {:>8} мс  '
+            'SQL {:>6}  ошибок {}'.format(
+                view, stats['throughput_rps'], stats['p50_ms'],
+                stats['p95_ms'], stats['p99_ms'],
+                stats['queries_per_request'], stats['errors']
+            )
+        )
+        return stats
+
+    def compare(self, report, path, tolerance):
+        try:
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        for key in ('target', 'database', 'concurrency'):
+            if baseline['meta'].get(key) != report['meta'][key]:
+                self.stdout.write(self.style.WARNING(
+                    f'{key} базового прогона: {baseline["meta"].get(key)}, '
+                    f'сейчас: {report["meta"][key]}'
+                ))
+        regressions = 0
+        for view, rows in compare(
+            report['views'], baseline['views'], tolerance
+        ).items():
+            for metric, value, before, change, regressed in rows:
+                line = (
+                    f'{view:<13} {metric:<20} {before} → {value} '
+                    f'({change:+.1%})'
+                )
+                if regressed:
+                    regressions += 1
+                    line = self.style.ERROR(line)
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                f'Хуже базового прогона {path} больше чем на '
+                f'{tolerance:.0%}: {regressions} показателей'
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,99 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import MediaBlob, PostImage
+from posts.storage import content_storage, TEMP_PREFIX
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы картинок постов, на которые не осталось ссылок, '
+        'вместе с их миниатюрами'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=float, default=24,
+            help='Не трогать файлы, изменённые за последние столько часов: '
+                 'ссылку на только что загруженный файл ещё сохраняют'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено'
+        )
+
+    def handle(self, *args, **options):
+        self.deadline = time.time() - options['grace'] * 60 * 60
+        self.dry_run = options['dry_run']
+        self.removed = self.freed = 0
+        unreferenced = MediaBlob.objects.filter(
+            refcount__lte=0
+        ).values_list('name', flat=True)
+        for name in list(unreferenced.iterator()):
+            self.remove(name, blob=True)
+        for names in self.stale_files():
+            known = set(
+                MediaBlob.objects.filter(
+                    name__in=names
+                ).values_list('name', flat=True)
+            ) | set(
+                PostImage.objects.filter(
+                    image__in=names
+                ).values_list('image', flat=True)
+            )
+            for name in names:
+                if name not in known:
+                    self.remove(name)
+        self.stdout.write(
+            '{}: {}, {:.1f} МБ'.format(
+                'Будет удалено' if self.dry_run else 'Удалено файлов',
+                self.removed, self.freed / 2 ** 20
+            )
+        )
+
+    def stale_files(self):
+        """Имена файлов хранилища старше --grace, пачками."""
+        root = content_storage.path('')
+        batch = []
+        for directory, _, files in os.walk(content_storage.path('posts')):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                if os.stat(path).st_mtime > self.deadline:
+                    continue
+                batch.append(
+                    os.path.relpath(path, root).replace(os.sep, '/')
+                )
+                if len(batch) == BATCH_SIZE:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def remove(self, name, blob=False):
+        try:
+            stat = os.stat(content_storage.path(name))
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and stat.st_mtime > self.deadline:
+            # Файл загрузили заново, ссылка на него вот-вот появится.
+            return
+        if self.dry_run:
+            self.stdout.write(name)
+        else:
+            # Ссылка могла появиться, пока шёл обход.
+            if blob and not MediaBlob.objects.filter(
+                name=name, refcount__lte=0
+            ).delete()[0]:
+                return
+            if os.path.basename(name).startswith(TEMP_PREFIX):
+                content_storage.delete(name)
+            elif stat is not None:
+                default.backend.delete(ImageFile(name, content_storage))
+        self.removed += 1
+        self.freed += stat.st_size if stat is not None else 0
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.dataset import DatasetGenerator
+
+COUNTS = {
+    'users': (1000, 'Число пользователей'),
+    'groups': (20, 'Число групп'),
+    'posts': (10000, 'Число постов'),
+    'comments': (20000, 'Число комментариев'),
+    'follows': (10000, 'Примерное число подписок'),
+    'images': (100, 'Число постов с картинкой'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        for name, (default, help_text) in COUNTS.items():
+            parser.add_argument(
+                f'--{name}', type=int, default=default, help=help_text
+            )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Один seed — один и тот же набор данных'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Строк в одной пачке bulk_create'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней опубликованы посты'
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.0,
+            help='Показатель закона Ципфа для популярности авторов'
+        )
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль всех созданных пользователей'
+        )
+        parser.add_argument('--locale', default='ru_RU', help='Язык Faker')
+
+    def handle(self, *args, **options):
+        # Проверяем всё до записи: иначе база останется заполненной
+        # наполовину.
+        for name in COUNTS:
+            if options[name] < 0:
+                raise CommandError(f'--{name} не может быть отрицательным')
+        if options['images'] > options['posts']:
+            raise CommandError('--images не может быть больше --posts')
+        generator = DatasetGenerator(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            days=options['days'],
+            exponent=options['exponent'],
+            password=options['password'],
+            locale=options['locale'],
+            log=self.stdout.write,
+        )
+        generator.generate(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            images=options['images'],
+        )
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import PostImage
+from posts.tasks import pending_thumbnails, process_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Делает миниатюры картинок, для которых их ещё нет; '
+        'с --watch работает как фоновый обработчик очереди'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch', action='store_true',
+            help='Не завершаться, а проверять очередь каждые --interval с'
+        )
+        parser.add_argument('--interval', type=float, default=5.0)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Заново сделать миниатюры всех картинок, в том числе '
+                 'готовых: после изменения POST_IMAGE_THUMBNAILS'
+        )
+
+    def handle(self, *args, **options):
+        force = options['all']
+        while True:
+            done = 0
+            if force:
+                # Готовые миниатюры остаются на страницах, пока
+                # делаются новые варианты.
+                queue = PostImage.objects.order_by('pk').values_list(
+                    'pk', flat=True
+                )
+            else:
+                queue = pending_thumbnails()
+            for pk in list(queue.iterator()):
+                try:
+                    done += process_thumbnails(pk, force=force)
+                except Exception as error:
+                    # Картинка остаётся в очереди до следующего прохода.
+                    self.stderr.write(f'Картинка {pk}: {error}')
+            if done or not options['watch']:
+                self.stdout.write(f'Картинок обработано: {done}')
+            if not options['watch']:
+                return
+            force = False
+            time.sleep(options['interval'])
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики постов, подписок '
+        'и комментариев'
+    )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counters()
+        for field, count in fixed.items():
+            self.stdout.write(f'{field}: исправлено {count}')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
@@ -0,0 +1,68 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    stats = {}
+
+    def count(queryset, field, counter):
+        rows = queryset.order_by().values(field).annotate(
+            total=models.Count('pk')
+        )
+        for row in rows:
+            stats.setdefault(row[field], {})[counter] = row['total']
+
+    count(Post.objects.all(), 'author', 'posts_count')
+    count(Follow.objects.all(), 'author', 'followers_count')
+    count(Follow.objects.all(), 'user', 'following_count')
+    AuthorStats.objects.bulk_create(
+        [
+            AuthorStats(author_id=author_id, **counters)
+            for author_id, counters in stats.items()
+        ],
+        batch_size=500,
+    )
+    comments = Comment.objects.order_by().values('post').annotate(
+        total=models.Count('pk')
+    )
+    for row in comments:
+        Post.objects.filter(pk=row['post']).update(
+            comments_count=row['total']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0014_feeditem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Число постов')),
+                ('followers_count', models.IntegerField(default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.IntegerField(default=0, verbose_name='Число подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики автора',
+                'verbose_name_plural': 'Счётчики авторов',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:40
+
+from django.db import migrations
+
+# Схема записана здесь целиком, а не берётся из posts.search:
+# миграция должна выполнять одну и ту же DDL, как бы ни менялся модуль.
+CREATE_SEARCH_INDEX = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )''',
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS posts_comment_fts USING fts5(
+        text, content='posts_comment', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+    AFTER UPDATE OF text ON posts_post
+    WHEN old.text IS NOT new.text BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_comment_fts_insert
+    AFTER INSERT ON posts_comment BEGIN
+        INSERT INTO posts_comment_fts(rowid, text)
+        VALUES (new.id, new.text);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_comment_fts_delete
+    AFTER DELETE ON posts_comment BEGIN
+        INSERT INTO posts_comment_fts(posts_comment_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_comment_fts_update
+    AFTER UPDATE OF text ON posts_comment
+    WHEN old.text IS NOT new.text BEGIN
+        INSERT INTO posts_comment_fts(posts_comment_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_comment_fts(rowid, text)
+        VALUES (new.id, new.text);
+    END''',
+    "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')",
+    "INSERT INTO posts_comment_fts(posts_comment_fts) VALUES ('rebuild')",
+]
+
+DROP_SEARCH_INDEX = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_comment_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_comment_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_comment_fts_update',
+    'DROP TABLE IF EXISTS posts_post_fts',
+    'DROP TABLE IF EXISTS posts_comment_fts',
+]
+
+
+class RunSQLiteSQL(migrations.RunSQL):
+    """RunSQL, который выполняется только на SQLite: FTS5 есть лишь там."""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_feed_indexes'),
+    ]
+
+    operations = [
+        RunSQLiteSQL(CREATE_SEARCH_INDEX, DROP_SEARCH_INDEX),
+    ]
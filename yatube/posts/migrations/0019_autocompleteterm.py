@@ -0,0 +1,66 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+from posts.autocomplete import make_terms
+
+
+def fill_autocomplete(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Group = apps.get_model('posts', 'Group')
+    AutocompleteTerm = apps.get_model('posts', 'AutocompleteTerm')
+    terms = []
+    for user in User.objects.filter(is_active=True).iterator():
+        label = (
+            f'{user.first_name} {user.last_name}'.strip() or user.username
+        )
+        terms += [
+            AutocompleteTerm(
+                term=term, kind='user', object_id=user.pk,
+                value=user.username, label=label
+            ) for term in make_terms(user.username)
+        ]
+    for group in Group.objects.all().iterator():
+        terms += [
+            AutocompleteTerm(
+                term=term, kind='group', object_id=group.pk,
+                value=group.slug, label=group.title
+            ) for term in make_terms(group.slug, group.title)
+        ]
+    AutocompleteTerm.objects.bulk_create(terms, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0018_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutocompleteTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=200, verbose_name='Ключ')),
+                ('kind', models.CharField(choices=[('user', 'Пользователь'), ('group', 'Группа')], max_length=5, verbose_name='Тип')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id объекта')),
+                ('value', models.CharField(max_length=200, verbose_name='Адрес объекта')),
+                ('label', models.CharField(max_length=200, verbose_name='Подпись')),
+            ],
+            options={
+                'verbose_name': 'Ключ автодополнения',
+                'verbose_name_plural': 'Индекс автодополнения',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='autocompleteterm',
+            index=models.Index(fields=['term'], name='autocomplete_term_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='autocompleteterm',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id', 'term'), name='unique_autocomplete_term'),
+        ),
+        migrations.RunPython(fill_autocomplete, migrations.RunPython.noop),
+    ]
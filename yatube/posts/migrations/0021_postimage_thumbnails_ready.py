@@ -0,0 +1,22 @@
+# Generated by Django 2.2.16 on 2026-10-17 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_comment_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postimage',
+            name='thumbnails_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюры готовы'),
+        ),
+        migrations.AddIndex(
+            model_name='postimage',
+            index=models.Index(condition=models.Q(thumbnails_ready=False), fields=['id'], name='postimage_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-17 09:00
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def fill_media_blobs(apps, schema_editor):
+    PostImage = apps.get_model('posts', 'PostImage')
+    MediaBlob = apps.get_model('posts', 'MediaBlob')
+    references = PostImage.objects.exclude(image='').exclude(
+        image__isnull=True
+    ).order_by().values('image').annotate(total=Count('pk'))
+    MediaBlob.objects.bulk_create(
+        (
+            MediaBlob(name=row['image'], refcount=row['total'])
+            for row in references.iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_postimage_thumbnails_ready'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refcount', models.IntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='postimage',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузите картинку', null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AddIndex(
+            model_name='mediablob',
+            index=models.Index(condition=models.Q(refcount__lte=0), fields=['name'], name='mediablob_unreferenced_idx'),
+        ),
+        migrations.RunPython(fill_media_blobs, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 
 from django.db.models.constraints import UniqueConstraint
 
+from .storage import content_storage
+
 User = get_user_model()
 
 
@@ -34,10 +36,52 @@ class PostImage(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=content_storage,
         blank=True,
         null=True,
         help_text='Загрузите картинку'
     )
+    thumbnails_ready = models.BooleanField(
+        'Миниатюры готовы',
+        default=False,
+        editable=False
+    )
+
+    class Meta:
+        indexes = [
+            # Очередь фонового обработчика миниатюр (posts.tasks).
+            models.Index(
+                fields=['id'],
+                name='postimage_pending_idx',
+                condition=models.Q(thumbnails_ready=False)
+            ),
+        ]
+
+
+class MediaBlob(models.Model):
+    """Файл картинки в хранилище и число ссылок на него.
+
+    Одинаковые загрузки хранятся одним файлом (posts.storage). Счётчик
+    поддерживают сигналы PostImage, расхождения исправляет
+    reconcile_counters, файлы без ссылок удаляет collect_media.
+    """
+    name = models.CharField('Файл', max_length=100, primary_key=True)
+    refcount = models.IntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+        indexes = [
+            # Кандидаты на удаление для collect_media.
+            models.Index(
+                fields=['name'],
+                name='mediablob_unreferenced_idx',
+                condition=models.Q(refcount__lte=0)
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name}: {self.refcount}'
 
 
 class Post(models.Model):
@@ -59,14 +103,35 @@ class Post(models.Model):
     )
     created = models.DateTimeField(
         'Дата создания',
-        auto_now_add=True,
-        db_index=True
+        auto_now_add=True
+    )
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+    comments_count = models.IntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
     )
-
 
     class Meta:
+        # id разрешает равные даты: порядок ленты всегда однозначен
+        # и совпадает с ключами курсоров и индексов ниже.
+        ordering = ('-created', '-id')
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-created', '-id'],
+                name='post_created_idx'
+            ),
+            models.Index(
+                fields=['group', '-created', '-id'],
+                name='post_group_created_idx'
+            ),
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='post_author_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -91,14 +156,20 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(
         'Дата создания',
-        auto_now_add=True,
-        db_index=True
+        auto_now_add=True
     )
 
-
     class Meta:
+        # Комментарии читаются от старых к новым, как в обсуждении.
+        ordering = ('created', 'id')
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -122,7 +193,108 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка на автора'
         verbose_name_plural = 'Подписки на авторов'
-        UniqueConstraint(fields=['user', 'author'], name='unique_follower')
+        constraints = [
+            UniqueConstraint(fields=['user', 'author'], name='unique_follower')
+        ]
 
     def __str__(self):
         return f'{self.author}'
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок.
+
+    Заполняется при публикации поста (fan-out on write), поэтому
+    лента читается одним проходом по индексу (user, created, post).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост'
+    )
+    created = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            UniqueConstraint(fields=['user', 'post'], name='unique_feed_item')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='feed_user_created_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.post}'
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами при создании и удалении постов и подписок,
+    расхождения исправляет команда reconcile_counters.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор'
+    )
+    posts_count = models.IntegerField('Число постов', default=0)
+    followers_count = models.IntegerField('Число подписчиков', default=0)
+    following_count = models.IntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'{self.author}'
+
+
+class AutocompleteTerm(models.Model):
+    """Строка префиксного индекса автодополнения.
+
+    Один объект (пользователь или группа) даёт несколько ключей:
+    имя пользователя, slug, название группы и каждое его слово.
+    Ключи хранятся в нижнем регистре и читаются диапазоном по индексу.
+    """
+    USER = 'user'
+    GROUP = 'group'
+    KIND_CHOICES = (
+        (USER, 'Пользователь'),
+        (GROUP, 'Группа'),
+    )
+
+    term = models.CharField('Ключ', max_length=200)
+    kind = models.CharField('Тип', max_length=5, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField('id объекта')
+    value = models.CharField('Адрес объекта', max_length=200)
+    label = models.CharField('Подпись', max_length=200)
+
+    class Meta:
+        verbose_name = 'Ключ автодополнения'
+        verbose_name_plural = 'Индекс автодополнения'
+        constraints = [
+            UniqueConstraint(
+                fields=['kind', 'object_id', 'term'],
+                name='unique_autocomplete_term'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['term'], name='autocomplete_term_idx'),
+        ]
+
+    def __str__(self):
+        return self.term
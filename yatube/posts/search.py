@@ -0,0 +1,193 @@
+import re
+
+from django.db import connection, connections
+
+from .models import Post
+from .utils import (decode_cursor, FEED_ORDERING, keyset_pagination,
+                    KeysetPage, make_keyset_page, parse_cursor_int)
+
+POST_SEARCH_TABLE = 'posts_post_fts'
+COMMENT_SEARCH_TABLE = 'posts_comment_fts'
+# Совпадение в комментарии весит меньше совпадения в тексте поста.
+COMMENT_RANK_WEIGHT = 0.5
+# Меньший bm25 — лучше; при равном ранге порядок задаёт id.
+SEARCH_ORDERING = ('search_rank', 'pk')
+
+# Внешние (content=) FTS5-таблицы хранят только индекс, текст читается
+# из posts_post и posts_comment. Триггеры держат индекс в актуальном
+# состоянии при любых изменениях, включая bulk_create и update().
+SEARCH_SCHEMA = [
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+        text, content='{source}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )'''
+    for table, source in (
+        (POST_SEARCH_TABLE, 'posts_post'),
+        (COMMENT_SEARCH_TABLE, 'posts_comment'),
+    )
+] + [
+    statement
+    for table, source in (
+        (POST_SEARCH_TABLE, 'posts_post'),
+        (COMMENT_SEARCH_TABLE, 'posts_comment'),
+    )
+    for statement in (
+        f'''CREATE TRIGGER IF NOT EXISTS {table}_insert
+        AFTER INSERT ON {source} BEGIN
+            INSERT INTO {table}(rowid, text) VALUES (new.id, new.text);
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {table}_delete
+        AFTER DELETE ON {source} BEGIN
+            INSERT INTO {table}({table}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {table}_update
+        AFTER UPDATE OF text ON {source}
+        WHEN old.text IS NOT new.text BEGIN
+            INSERT INTO {table}({table}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {table}(rowid, text) VALUES (new.id, new.text);
+        END''',
+    )
+]
+
+RANKED_POSTS_SQL = f'''
+    SELECT post_id, MIN(rank) AS search_rank FROM (
+        SELECT rowid AS post_id, bm25({POST_SEARCH_TABLE}) AS rank
+        FROM {POST_SEARCH_TABLE}
+        WHERE {POST_SEARCH_TABLE} MATCH %s
+        UNION ALL
+        SELECT comment.post_id, bm25({COMMENT_SEARCH_TABLE}) * %s
+        FROM {COMMENT_SEARCH_TABLE}
+        JOIN posts_comment AS comment
+            ON comment.id = {COMMENT_SEARCH_TABLE}.rowid
+        WHERE {COMMENT_SEARCH_TABLE} MATCH %s
+    )
+    GROUP BY post_id
+    {{having}}
+    ORDER BY search_rank {{direction}}, post_id {{direction}}
+    LIMIT %s
+'''
+
+
+def search_available(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def create_search_index(connection):
+    """Создаёт FTS5-таблицы и триггеры, если их ещё нет."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in SEARCH_SCHEMA:
+            cursor.execute(statement)
+
+
+def drop_search_triggers(connection):
+    """Снимает триггеры индекса на время массовой загрузки;
+    затем индекс строится заново (rebuild_search_index)."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for table in (POST_SEARCH_TABLE, COMMENT_SEARCH_TABLE):
+            for event in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {table}_{event}')
+
+
+def rebuild_search_index(connection):
+    """Перестраивает индекс по текущим постам и комментариям
+    и возвращает триггеры."""
+    if connection.vendor != 'sqlite':
+        return
+    create_search_index(connection)
+    with connection.cursor() as cursor:
+        for table in (POST_SEARCH_TABLE, COMMENT_SEARCH_TABLE):
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def ensure_search_index(sender, using, **kwargs):
+    # На SQLite Django меняет схему, пересоздавая таблицу, и триггеры
+    # на старой таблице пропадают; после миграций восстанавливаем их.
+    create_search_index(connections[using])
+
+
+def build_match(query):
+    """Запрос FTS5 из пользовательской строки: все слова, без операторов.
+
+    Каждое слово берётся в кавычки, поэтому синтаксис FTS5
+    (NEAR, OR, *, двоеточия) из ввода не выполняется.
+    """
+    return ' '.join(f'"{term}"' for term in re.findall(r'\w+', query))
+
+
+def filter_matching_posts(posts, query):
+    """Посты из posts, в тексте которых есть все слова query.
+
+    Подзапрос в pk__in Django обернул бы в двойные скобки, и SQLite
+    прочёл бы его как скалярный: осталось бы одно первое совпадение.
+    Поэтому условие IN (SELECT ...) пишется целиком через extra.
+    """
+    table = posts.model._meta.db_table
+    return posts.extra(
+        where=[
+            f'"{table}"."id" IN (SELECT rowid FROM {POST_SEARCH_TABLE} '
+            f'WHERE {POST_SEARCH_TABLE} MATCH %s)'
+        ],
+        params=[build_match(query)],
+    )
+
+
+def _parse_rank(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def _parse_cursor(token):
+    return decode_cursor(token, (_parse_rank, parse_cursor_int))
+
+
+def _ranked_post_ids(match, cursor, backwards, limit):
+    sign, direction = ('<', 'DESC') if backwards else ('>', 'ASC')
+    having = ''
+    params = [match, COMMENT_RANK_WEIGHT, match]
+    if cursor is not None:
+        having = f'HAVING (search_rank, post_id) {sign} (%s, %s)'
+        params += cursor
+    sql = RANKED_POSTS_SQL.format(having=having, direction=direction)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params + [limit])
+        return db_cursor.fetchall()
+
+
+def search_posts(request, query, post_per_page):
+    """Страница постов, найденных по тексту поста или комментариев.
+
+    Посты упорядочены по релевантности (bm25) и листаются курсорами
+    ?after=/?before= по паре (ранг, id), как обычные ленты.
+    """
+    match = build_match(query)
+    if not match:
+        return KeysetPage([])
+    posts = Post.objects.select_related('author', 'group')
+    if not search_available():
+        return keyset_pagination(
+            request, posts.filter(text__icontains=query), post_per_page,
+            FEED_ORDERING
+        )
+    after = _parse_cursor(request.GET.get('after'))
+    before = _parse_cursor(request.GET.get('before'))
+    backwards = before is not None
+    ranked = _ranked_post_ids(
+        match, before if backwards else after, backwards, post_per_page + 1
+    )
+    found = posts.in_bulk([post_id for post_id, rank in ranked])
+    rows = []
+    for post_id, rank in ranked:
+        if post_id in found:
+            found[post_id].search_rank = rank
+            rows.append(found[post_id])
+    return make_keyset_page(
+        rows, post_per_page, SEARCH_ORDERING, backwards,
+        backwards or after is not None
+    )
@@ -0,0 +1,183 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import drop_terms, index_group, index_user
+from .caching import (bump_generation, GLOBAL_SCOPE, invalidate_post_pages,
+                      touch_post)
+from .counters import (change_author_stats, change_comments_count,
+                       change_media_refs)
+from .feed import backfill_feed, fan_out_post, prune_feed
+from .models import (AutocompleteTerm, Comment, Follow, Group, Post,
+                     PostImage, User)
+from .tasks import enqueue_thumbnails
+from .timeline import drop_timeline, push_to_timeline
+
+# Поля пользователя, которые видны на страницах с его постами.
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        change_author_stats(instance.author_id, posts_count=1)
+        fan_out_post(instance)
+        push_to_timeline(instance)
+
+
+@receiver(post_delete, sender=Post)
+def drop_post_from_timeline(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, posts_count=-1)
+    drop_timeline(instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    # Пост могли перенести в другую группу: её страницу тоже нужно сбросить.
+    instance._old_group_slug = instance.pk and Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group__slug', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_cache(sender, instance, **kwargs):
+    invalidate_post_pages(
+        instance, getattr(instance, '_old_group_slug', None)
+    )
+
+
+@receiver(post_save, sender=PostImage)
+@receiver(post_delete, sender=PostImage)
+def touch_post_on_image_change(sender, instance, **kwargs):
+    # Картинка — часть карточки поста: новая дата изменения сменит
+    # ключ кэша карточки.
+    touch_post(instance.post)
+
+
+@receiver(pre_save, sender=PostImage)
+def reset_thumbnails_on_image_change(sender, instance, **kwargs):
+    # Прежнее имя файла нужно и счётчику ссылок (count_media_refs).
+    old_names = list(PostImage.objects.filter(pk=instance.pk).values_list(
+        'image', flat=True
+    )) if instance.pk else []
+    instance._old_image_name = old_names[0] if old_names else None
+    if old_names and (old_names[0] or '') != (instance.image.name or ''):
+        instance.thumbnails_ready = False
+
+
+@receiver(post_save, sender=PostImage)
+def count_media_refs(sender, instance, **kwargs):
+    old_name = getattr(instance, '_old_image_name', None)
+    if old_name != instance.image.name:
+        change_media_refs(instance.image.name, 1)
+        change_media_refs(old_name, -1)
+
+
+@receiver(post_delete, sender=PostImage)
+def release_media_ref(sender, instance, **kwargs):
+    change_media_refs(instance.image.name, -1)
+
+
+@receiver(post_save, sender=PostImage)
+def queue_thumbnails(sender, instance, **kwargs):
+    if not instance.thumbnails_ready:
+        enqueue_thumbnails(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_cache(sender, instance, **kwargs):
+    bump_generation(GLOBAL_SCOPE)
+
+
+@receiver(post_save, sender=Group)
+def index_group_for_autocomplete(sender, instance, **kwargs):
+    index_group(instance)
+
+
+@receiver(post_delete, sender=Group)
+def drop_group_from_autocomplete(sender, instance, **kwargs):
+    drop_terms(AutocompleteTerm.GROUP, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def index_user_for_autocomplete(sender, instance, update_fields, **kwargs):
+    # Вход в систему сохраняет только last_login: индекс не меняется.
+    if update_fields and not {'username', 'first_name', 'last_name',
+                              'is_active'} & set(update_fields):
+        return
+    index_user(instance)
+
+
+@receiver(pre_save, sender=User)
+def remember_user_name(sender, instance, update_fields, **kwargs):
+    # Прежнее имя нужно, чтобы сбросить страницу профиля по старому адресу.
+    instance._old_names = None
+    if update_fields and not set(USER_NAME_FIELDS) & set(update_fields):
+        return
+    if instance.pk:
+        instance._old_names = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*USER_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    old_names = getattr(instance, '_old_names', None)
+    if old_names is None or old_names == tuple(
+        getattr(instance, field) for field in USER_NAME_FIELDS
+    ):
+        return
+    # Имя автора есть на карточках всех его постов, а они — в любой ленте;
+    # ключ кэша самой карточки включает имя автора.
+    bump_generation(
+        GLOBAL_SCOPE,
+        f'profile:{old_names[0]}',
+        f'profile:{instance.username}',
+    )
+
+
+@receiver(post_delete, sender=User)
+def drop_user_from_autocomplete(sender, instance, **kwargs):
+    drop_terms(AutocompleteTerm.USER, instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def fill_feed_on_follow(sender, instance, created, **kwargs):
+    if created:
+        change_author_stats(instance.author_id, followers_count=1)
+        change_author_stats(instance.user_id, following_count=1)
+        backfill_feed(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed_on_unfollow(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, followers_count=-1)
+    change_author_stats(instance.user_id, following_count=-1)
+    prune_feed(instance)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_cache(sender, instance, **kwargs):
+    bump_generation(
+        f'profile:{instance.author.username}',
+        f'profile:{instance.user.username}',
+    )
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_cache(sender, instance, **kwargs):
+    bump_generation(f'post:{instance.post_id}')
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+# Префикс временных файлов, пока у загрузки ещё нет имени;
+# брошенные удаляет collect_media.
+TEMP_PREFIX = '.upload-'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла — SHA-256 его содержимого.
+
+    Каталог из upload_to сохраняется: posts/ab/cd/<хеш>.jpg. Одинаковые
+    загрузки попадают в один файл, а содержимое по имени никогда
+    не меняется, поэтому URL можно кэшировать навсегда
+    (Cache-Control: immutable). Ссылки на файлы считает MediaBlob.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя известно только после чтения содержимого, в _save.
+        return name
+
+    def _save(self, name, content):
+        directory, base_name = posixpath.split(name)
+        extension = os.path.splitext(base_name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        # Содержимое читается один раз: пишется во временный файл
+        # и тут же хешируется.
+        digest = hashlib.sha256()
+        descriptor, temp_path = tempfile.mkstemp(
+            prefix=TEMP_PREFIX, dir=self.path(directory)
+        )
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension
+            )
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if os.path.exists(full_path):
+                # Такой файл уже есть. Свежее время изменения не даёт
+                # collect_media удалить его, пока ссылка не сохранена.
+                os.utime(full_path)
+            else:
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                # Одновременная загрузка того же файла заменит его
+                # тем же содержимым.
+                os.replace(temp_path, full_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+
+content_storage = ContentAddressedStorage()
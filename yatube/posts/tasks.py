@@ -0,0 +1,85 @@
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .caching import touch_post
+from .images import generate_thumbnails
+from .models import PostImage
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def process_thumbnails(post_image_id, force=False):
+    """Делает миниатюры картинки и отмечает их готовыми.
+
+    Возвращает False, если картинку удалили или её уже обработали;
+    с force обрабатывает и готовые, например после смены вариантов
+    в POST_IMAGE_THUMBNAILS.
+    """
+    images = PostImage.objects.filter(pk=post_image_id)
+    if not force:
+        images = images.filter(thumbnails_ready=False)
+    image = images.select_related('post__author', 'post__group').first()
+    if image is None:
+        return False
+    if image.image:
+        generate_thumbnails(image.image)
+    # Картинку могли заменить, пока делались миниатюры: тогда флаг
+    # уже сброшен и её обработает следующее задание.
+    PostImage.objects.filter(
+        pk=image.pk, image=image.image.name
+    ).update(thumbnails_ready=True)
+    # Карточка с заглушкой закэширована: новая дата изменения поста
+    # сменит её ключ.
+    touch_post(image.post)
+    return True
+
+
+def pending_thumbnails():
+    return PostImage.objects.filter(
+        thumbnails_ready=False
+    ).order_by('pk').values_list('pk', flat=True)
+
+
+def _run_worker():
+    while True:
+        post_image_id = _queue.get()
+        try:
+            process_thumbnails(post_image_id)
+        except Exception:
+            logger.exception('Миниатюры картинки %s не созданы', post_image_id)
+        finally:
+            close_old_connections()
+            _queue.task_done()
+
+
+def _start_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_run_worker, name='thumbnails', daemon=True
+            )
+            _worker.start()
+
+
+def enqueue_thumbnails(post_image_id):
+    """Ставит картинку в очередь на миниатюры согласно THUMBNAIL_WORKER.
+
+    Задания фонового потока живут в памяти процесса; потерянные при
+    перезапуске подберёт manage.py generate_thumbnails: необработанные
+    картинки отмечены thumbnails_ready=False.
+    """
+    if settings.THUMBNAIL_WORKER == 'sync':
+        process_thumbnails(post_image_id)
+    elif settings.THUMBNAIL_WORKER == 'thread':
+        _start_worker()
+        # Поток читает картинку своим соединением: только после COMMIT.
+        transaction.on_commit(lambda: _queue.put(post_image_id))
@@ -0,0 +1,21 @@
+from django import template
+
+from posts.images import ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post_image, size):
+    """Готовая миниатюра картинки поста или заглушка того же размера.
+
+    {% post_thumbnail image 'card' as thumb %}; у заглушки пустой url.
+    Миниатюры, заранее прочитанные attach_thumbnails, берутся без
+    обращения к хранилищу.
+    """
+    attached = getattr(post_image, 'thumbnails', {})
+    if size in attached:
+        return attached[size]
+    if not post_image.thumbnails_ready:
+        return ready_thumbnail(None, size)
+    return ready_thumbnail(post_image.image, size)
@@ -0,0 +1,60 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts.caching import get_generations, get_or_recompute, LOCK_KEY
+
+
+class GetOrRecomputeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(return_value='свежая страница')
+
+    def test_fresh_value_is_not_recomputed(self):
+        """Свежее значение отдаётся из кэша без пересчёта."""
+        get_or_recompute('key', self.compute, 60, version=1)
+        value = get_or_recompute('key', self.compute, 60, version=1)
+        self.assertEqual(value, 'свежая страница')
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой процесс пересчитывает, отдаётся устаревшая копия."""
+        get_or_recompute('key', lambda: 'старая страница', 60, version=1)
+        cache.add(LOCK_KEY.format('key'), 1)
+        value = get_or_recompute('key', self.compute, 60, version=2)
+        self.assertEqual(value, 'старая страница')
+        self.compute.assert_not_called()
+
+    def test_stale_value_recomputed_by_lock_owner(self):
+        """Процесс, захвативший блокировку, пересчитывает значение."""
+        get_or_recompute('key', lambda: 'старая страница', 60, version=1)
+        value = get_or_recompute('key', self.compute, 60, version=2)
+        self.assertEqual(value, 'свежая страница')
+        self.assertIsNone(cache.get(LOCK_KEY.format('key')))
+
+    @override_settings(PAGE_CACHE_EARLY_RECOMPUTE_BETA=1)
+    def test_early_recompute(self):
+        """XFetch досрочно пересчитывает значение с долгим пересчётом."""
+        get_or_recompute('key', lambda: 'старая страница', 60, version=1)
+        entry = cache.get('key')
+        entry['delta'] = 10 ** 6
+        cache.set('key', entry)
+        with mock.patch('posts.caching.random.random', return_value=0.5):
+            value = get_or_recompute('key', self.compute, 60, version=1)
+        self.assertEqual(value, 'свежая страница')
+
+
+class GenerationsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(PAGE_CACHE_LOCAL_TIMEOUT=60)
+    def test_local_cache_generations_expire(self):
+        """С локальным кэшем поколения истекают: сброс в другом процессе
+        виден не позже PAGE_CACHE_LOCAL_TIMEOUT."""
+        first = get_generations(['index'])
+        self.assertEqual(get_generations(['index']), first)
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertNotEqual(get_generations(['index']), first)
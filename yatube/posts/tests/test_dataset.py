@@ -0,0 +1,183 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command, CommandError
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from posts.counters import reconcile_counters
+from posts.models import (AutocompleteTerm, Comment, FeedItem, Follow, Group,
+                          Post, PostImage, User)
+from posts.search import filter_matching_posts
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+DATASET = {
+    'users': 30,
+    'groups': 3,
+    'posts': 120,
+    'comments': 200,
+    'follows': 90,
+    'images': 5,
+    'batch_size': 50,
+}
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDatasetTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def generate(self, seed=1):
+        call_command(
+            'generate_dataset', seed=seed, stdout=StringIO(), **DATASET
+        )
+
+    def snapshot(self):
+        return (
+            list(User.objects.order_by('pk').values_list(
+                'username', 'first_name'
+            )),
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'author__username', 'group__slug', 'comments_count'
+            )),
+            list(Follow.objects.order_by('pk').values_list(
+                'user__username', 'author__username'
+            )),
+        )
+
+    def counts(self):
+        return {
+            model: model.objects.count()
+            for model in (User, Group, Post, Comment, PostImage)
+        }
+
+    def test_dataset_created(self):
+        """Команда создаёт заданное число строк и все производные данные."""
+        before = self.counts()
+        self.generate()
+        created = {
+            model: count - before[model]
+            for model, count in self.counts().items()
+        }
+        self.assertEqual(created, {
+            User: DATASET['users'],
+            Group: DATASET['groups'],
+            Post: DATASET['posts'],
+            Comment: DATASET['comments'],
+            PostImage: DATASET['images'],
+        })
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(
+            Follow.objects.filter(user_id=F('author_id')).exists()
+        )
+        # Счётчики и ленты уже сходятся с данными.
+        self.assertEqual(set(reconcile_counters().values()), {0})
+        self.assertEqual(
+            FeedItem.objects.count(),
+            sum(
+                Post.objects.filter(author_id=author_id).count()
+                for author_id in Follow.objects.values_list(
+                    'author_id', flat=True
+                )
+            )
+        )
+        self.assertEqual(
+            AutocompleteTerm.objects.filter(kind=AutocompleteTerm.USER)
+            .values('object_id').distinct().count(),
+            User.objects.filter(is_active=True).count()
+        )
+        # Индекс построен заново: находятся все посты с частым словом.
+        texts = dict(
+            Post.objects.order_by('-pk').values_list('pk', 'text')[
+                :DATASET['posts']
+            ]
+        )
+        words = {pk: set(re.findall(r'\w+', text.lower()))
+                 for pk, text in texts.items()}
+        word, _ = Counter(
+            word for post_words in words.values() for word in post_words
+        ).most_common(1)[0]
+        expected = {pk for pk, post_words in words.items()
+                    if word in post_words}
+        found = filter_matching_posts(
+            Post.objects.filter(pk__in=texts), word
+        ).values_list('pk', flat=True)
+        self.assertGreater(len(expected), 1)
+        self.assertLessEqual(expected, set(found))
+
+    def test_more_images_than_posts_rejected(self):
+        """Невыполнимые параметры отклоняются до записи в базу."""
+        before = self.counts()
+        for options in ({'images': DATASET['posts'] + 1}, {'users': -1}):
+            with self.subTest(options=options):
+                with self.assertRaises(CommandError):
+                    call_command(
+                        'generate_dataset', stdout=StringIO(),
+                        **dict(DATASET, **options)
+                    )
+                self.assertEqual(self.counts(), before)
+
+    def test_same_seed_same_dataset(self):
+        """Один seed даёт один и тот же набор данных, другой — другой."""
+        self.generate()
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+        User.objects.all().delete()
+        self.generate(seed=2)
+        self.assertNotEqual(self.snapshot()[1], first[1])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkCommandTest(TestCase):
+    VIEWS = ['index', 'post_detail', 'follow_index', 'add_comment']
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_dataset', stdout=StringIO(), **dict(DATASET, images=0)
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, 'benchmark.json')
+
+    def benchmark(self, **options):
+        call_command(
+            'benchmark', views=self.VIEWS, requests=4, concurrency=1,
+            warmup=1, output=self.output, stdout=StringIO(), **options
+        )
+        with open(self.output) as file:
+            return json.load(file)
+
+    def test_results_saved(self):
+        """Для каждого view сохраняются перцентили и число запросов."""
+        report = self.benchmark()
+        self.assertEqual(list(report['views']), self.VIEWS)
+        for stats in report['views'].values():
+            self.assertEqual(stats['requests'], 4)
+            self.assertEqual(stats['errors'], 0)
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+            self.assertGreater(stats['queries_per_request'], 0)
+
+    def test_regression_against_baseline(self):
+        """Прогон медленнее базового сверх допуска завершается ошибкой."""
+        report = self.benchmark()
+        for stats in report['views'].values():
+            stats['p95_ms'] = stats['p95_ms'] / 100
+        baseline = f'{self.output}.baseline'
+        with open(baseline, 'w') as file:
+            json.dump(report, file)
+        with self.assertRaises(CommandError):
+            self.benchmark(baseline=baseline)
@@ -1,9 +1,13 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from sorl.thumbnail import default
 from posts.forms import PostForm, CommentForm
+from posts.images import draft_jpeg, DraftEngine
 from posts.models import Post, Group, User, Comment
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
@@ -58,6 +62,8 @@ class PostCreateFormTests(TestCase):
             ).exists()
         )
 
+    # Миниатюры делает фоновый обработчик, а не запрос загрузки.
+    @override_settings(THUMBNAIL_WORKER='command')
     def test_create_post(self):
         """Валидная форма создает запись в Post."""
         post_count = Post.objects.count()
@@ -93,7 +99,7 @@ class PostCreateFormTests(TestCase):
             Post.objects.filter(
                 text=form_data['text'],
                 group=self.group,
-                image='posts/small.gif'
+                image__image__regex=settings.MEDIA_IMMUTABLE_PATTERNS[0]
             ).exists()
         )
 
@@ -153,6 +159,82 @@ class PostCreateFormTests(TestCase):
         )
 
 
+def make_jpeg(size, name='photo.jpg'):
+    content = BytesIO()
+    Image.new('RGB', size, 'green').save(content, 'JPEG')
+    return SimpleUploadedFile(name, content.getvalue(), 'image/jpeg')
+
+
+# Миниатюры делает фоновый обработчик, а не запрос загрузки.
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKER='command')
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='uploader')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create(self, image):
+        return self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с загрузкой', 'image': image}
+        )
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_too_large_file_rejected_while_uploading(self):
+        response = self.create(make_jpeg((600, 600)))
+        self.assertFormError(response, 'form', 'image', 'Файл больше 0 МБ.')
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected_by_header(self):
+        response = self.create(make_jpeg((20, 10)))
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 0 Мпикс.'
+        )
+
+    def test_not_an_image_rejected(self):
+        response = self.create(
+            SimpleUploadedFile('notes.jpg', b'not an image', 'image/jpeg')
+        )
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=300)
+    def test_large_original_downscaled_on_ingest(self):
+        self.create(make_jpeg((1200, 600)))
+        post_image = Post.objects.get(author=self.user).image.get()
+        self.assertEqual(
+            (post_image.image.width, post_image.image.height), (300, 150)
+        )
+
+    def test_wide_jpeg_decoded_reduced(self):
+        """Вытянутый JPEG декодируется сразу уменьшенным: рамка draft
+        в пропорциях картинки, а не квадратная."""
+        image = Image.open(make_jpeg((4000, 1000)))
+        draft_jpeg(image, 1000 / 4000)
+        self.assertEqual(image.size, (1000, 250))
+        image = Image.open(make_jpeg((4000, 1000)))
+        thumbnail = DraftEngine().create(
+            image, (480, 170), dict(default.backend.default_options,
+                                    crop='center')
+        )
+        self.assertEqual(thumbnail.size, (480, 170))
+        # Для обрезки нужна высота 170: по ней масштаб 1/4.
+        self.assertEqual(image.size, (1000, 250))
+
+    def test_edit_replaces_image(self):
+        self.create(make_jpeg((100, 100)))
+        post = Post.objects.get(author=self.user)
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': post.text, 'image': make_jpeg((50, 50), 'new.jpg')}
+        )
+        post_image = post.image.get()
+        self.assertEqual(post_image.image.width, 50)
+
+
 class CommentCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -1,6 +1,21 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import StringIO
 
-from ..models import Comment, Follow, Group, Post, User
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from ..counters import get_stats, reconcile_counters
+from ..models import (AuthorStats, Comment, Follow, Group, MediaBlob, Post,
+                      PostImage, User)
+from ..storage import content_storage
+from .test_forms import make_jpeg
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class PostModelTest(TestCase):
@@ -114,3 +129,130 @@ class FollowModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     follow._meta.get_field(value).verbose_name, expected)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.follower, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(self.follower.stats.following_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        stats = AuthorStats.objects.get(author=self.author)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertEqual(post.comments_count, 0)
+
+    def test_user_with_posts_and_follows_deleted(self):
+        """Удаление пользователя не заводит заново его счётчики."""
+        user = User.objects.create_user(username='leaving')
+        Post.objects.create(text='Последний пост', author=user)
+        Follow.objects.create(user=self.follower, author=user)
+        Follow.objects.create(user=user, author=self.author)
+        followers = get_stats(self.author).followers_count
+        user_id = user.pk
+        user.delete()
+        connection.check_constraints()
+        self.assertFalse(
+            AuthorStats.objects.filter(author_id=user_id).exists()
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.author).followers_count,
+            followers - 1
+        )
+
+    def test_reconcile_counters(self):
+        """reconcile_counters исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        AuthorStats.objects.filter(author=self.author).update(posts_count=5)
+        Post.objects.filter(pk=post.pk).update(comments_count=3)
+        fixed = reconcile_counters()
+        self.assertEqual(fixed['posts_count'], 1)
+        self.assertEqual(fixed['comments_count'], 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.author).posts_count, 1
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaStorageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='media_owner')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def add_image(self, upload):
+        return PostImage.objects.create(post=self.post, image=upload)
+
+    def refcount(self, name):
+        return MediaBlob.objects.get(name=name).refcount
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.add_image(make_jpeg((40, 20), 'meme.jpg'))
+        second = self.add_image(make_jpeg((40, 20), 'meme_copy.JPG'))
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertRegex(name, settings.MEDIA_IMMUTABLE_PATTERNS[0])
+        self.assertEqual(self.refcount(name), 2)
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(first.image.path))), 1
+        )
+        second.delete()
+        self.assertEqual(self.refcount(name), 1)
+
+    def test_replaced_image_releases_old_file(self):
+        image = self.add_image(make_jpeg((40, 20), 'old.jpg'))
+        old_name = image.image.name
+        image.image = make_jpeg((20, 40), 'new.jpg')
+        image.save()
+        self.assertEqual(self.refcount(old_name), 0)
+        self.assertEqual(self.refcount(image.image.name), 1)
+
+    def test_collect_media_removes_unreferenced_files(self):
+        kept = self.add_image(make_jpeg((40, 20), 'kept.jpg'))
+        dropped = self.add_image(make_jpeg((20, 40), 'dropped.jpg'))
+        dropped_path = dropped.image.path
+        dropped.delete()
+        orphan = content_storage.save(
+            'posts/orphan.txt', ContentFile(b'orphan')
+        )
+        call_command('collect_media', stdout=StringIO())
+        # Только что загруженные файлы защищены --grace.
+        self.assertTrue(os.path.exists(dropped_path))
+        call_command('collect_media', grace=0, dry_run=True, stdout=StringIO())
+        self.assertTrue(os.path.exists(dropped_path))
+
+        call_command('collect_media', grace=0, stdout=StringIO())
+        self.assertFalse(os.path.exists(dropped_path))
+        self.assertFalse(content_storage.exists(orphan))
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertFalse(
+            MediaBlob.objects.filter(refcount__lte=0).exists()
+        )
+
+    def test_reconcile_counters_fixes_refcount(self):
+        image = self.add_image(make_jpeg((40, 20)))
+        MediaBlob.objects.filter(name=image.image.name).update(refcount=7)
+        self.assertEqual(reconcile_counters()['refcount'], 1)
+        self.assertEqual(self.refcount(image.image.name), 1)
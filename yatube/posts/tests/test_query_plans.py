@@ -0,0 +1,102 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import override_settings, TestCase
+
+from posts.feed import follow_feed, FOLLOW_FEED_ORDERING
+from posts.models import Follow, Group, Post, User
+from posts.timeline import author_sources
+from posts.utils import FEED_ORDERING, keyset_filter, POSTS_PER_PAGE
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса в формате SQLite')
+class FeedQueryPlanTest(TestCase):
+    """Ленты читаются по индексу, без сортировки во временном B-дереве."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Thank_you')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=cls.author, group=cls.group)
+            for number in range(POSTS_PER_PAGE + 3)
+        )
+        cls.cursor = list(
+            Post.objects.values_list('created', 'pk')[POSTS_PER_PAGE]
+        )
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def page(self, posts, ordering=FEED_ORDERING, cursor=None):
+        if cursor is not None:
+            posts = posts.filter(keyset_filter(ordering, cursor))
+        return posts.order_by(*ordering)[:POSTS_PER_PAGE + 1]
+
+    def test_feed_queries_use_indexes(self):
+        """Первая и следующие страницы лент идут по своим индексам."""
+        feeds = {
+            'post_created_idx': Post.objects.select_related(
+                'author', 'group'
+            ),
+            'post_group_created_idx': self.group.posts.select_related(
+                'author', 'group'
+            ),
+            'post_author_created_idx': Post.objects.filter(
+                author=self.author
+            ).select_related('author', 'group'),
+        }
+        for index, posts in feeds.items():
+            for cursor in (None, self.cursor):
+                with self.subTest(index=index, cursor=cursor):
+                    self.assertUsesIndex(
+                        self.page(posts, cursor=cursor), index
+                    )
+
+    def test_follow_feed_uses_index(self):
+        """Лента подписок читается по индексу материализованной ленты."""
+        posts, = follow_feed(self.user)
+        self.assertUsesIndex(
+            self.page(posts, FOLLOW_FEED_ORDERING), 'feed_user_created_idx'
+        )
+
+    def test_default_ordering_uses_index(self):
+        """Порядок по умолчанию — от новых к старым, по индексу."""
+        self.assertEqual(
+            list(Post.objects.values_list('pk', flat=True)),
+            list(
+                Post.objects.order_by(*FEED_ORDERING).values_list(
+                    'pk', flat=True
+                )
+            ),
+        )
+        self.assertUsesIndex(Post.objects.all()[:1], 'post_created_idx')
+
+    @override_settings(FEED_CELEBRITY_THRESHOLD=1)
+    def test_celebrity_source_uses_index(self):
+        """Посты популярного автора читаются по индексу автора."""
+        push, pull = follow_feed(self.user)
+        for cursor in (None, self.cursor):
+            with self.subTest(cursor=cursor):
+                self.assertUsesIndex(
+                    self.page(pull, FOLLOW_FEED_ORDERING, cursor),
+                    'post_author_created_idx'
+                )
+
+    def test_timeline_fallback_uses_index(self):
+        """Лента за пределами кэша читается по индексу автора."""
+        source, = author_sources([self.author.pk])
+        for cursor in (None, self.cursor):
+            with self.subTest(cursor=cursor):
+                self.assertUsesIndex(
+                    self.page(source, cursor=cursor),
+                    'post_author_created_idx'
+                )
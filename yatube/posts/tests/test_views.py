@@ -1,15 +1,27 @@
 # deals/tests/test_views.py
+import os
 import shutil
 import tempfile
+from http import HTTPStatus
+from io import BytesIO, StringIO
 from django.core.cache import cache
 
 from django import forms
 from django.conf import settings
+from django.contrib import admin
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.templatetags.static import static
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from posts.models import Group, Post, User, Comment
-from posts.utils import POSTS_PER_PAGE
+from PIL import Image
+from posts.admin import PostAdmin
+from posts.images import attach_thumbnails, thumbnail_file
+from posts.models import (Comment, FeedItem, Follow, Group, Post, PostImage,
+                          User)
+from posts.timeline import TIMELINE_KEY
+from posts.utils import (COMMENTS_PER_PAGE, encode_cursor, KeysetPage,
+                         POSTS_PER_PAGE)
 
 POSTS_FOR_PAGINATOR_TEST = 13
 POSTS_PER_PAGE_SECOND = 3
@@ -121,7 +133,7 @@ class PostPagesTests(TestCase):
             reverse('posts:group_list', kwargs={'slug': self.group_test.slug})
         )
         post_test_group = response.context.get('page_obj').object_list
-        self.assertEqual(post_test_group.count(), 0)
+        self.assertEqual(len(post_test_group), 0)
 
     def test_correct_working_post_detail_context(self):
         """Шаблон post_detail сформирован с правильным контекстом."""
@@ -133,7 +145,7 @@ class PostPagesTests(TestCase):
         self.assertEqual(response_context.author, self.post.author)
         self.assertEqual(response_context.group, self.post.group)
         self.assertEqual(response_context.image, self.post.image)
-        response_context = response.context.get('comments').first()
+        response_context = response.context.get('comments')[0]
         self.assertEqual(response_context.id, self.post.pk)
         self.assertEqual(response_context.text, self.comment.text)
 
@@ -202,6 +214,72 @@ class PaginatorViewsTest(TestCase):
                 len(response.context['page_obj']), POSTS_PER_PAGE_SECOND
             )
 
+    def test_keyset_pages(self):
+        """Курсоры ведут на следующую и обратно на первую страницу."""
+        url = reverse('posts:index')
+        first_page = self.authorized_client.get(url).context['page_obj']
+        self.assertEqual(len(first_page), POSTS_PER_PAGE)
+        self.assertFalse(first_page.has_previous())
+        response = self.authorized_client.get(
+            url, {'after': first_page.next_cursor}
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), POSTS_PER_PAGE_SECOND)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(
+            {post.pk for post in first_page}
+            & {post.pk for post in second_page}
+        )
+        response = self.authorized_client.get(
+            url, {'before': second_page.previous_cursor}
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [post.pk for post in first_page]
+        )
+
+    def test_cursor_with_wrong_types_ignored(self):
+        """Курсор правильного формата, но со значениями не того типа,
+        считается отсутствующим: открывается первая страница."""
+        post = Post.objects.first()
+        cursors = [
+            ['не дата', post.pk],
+            [post.created.isoformat(), 'не id'],
+            [post.created.isoformat(), True],
+            [post.created.isoformat(), 2 ** 64],
+            ['2021-13-45T00:00:00', post.pk],
+            [post.created.replace(tzinfo=None).isoformat(), post.pk],
+            [[], {}],
+        ]
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            first_page = list(
+                self.authorized_client.get(url).context['page_obj']
+            )
+            for values in cursors:
+                for param in ('after', 'before'):
+                    with self.subTest(url=url, values=values, param=param):
+                        response = self.authorized_client.get(
+                            url, {param: encode_cursor(values)}
+                        )
+                        self.assertEqual(response.status_code, HTTPStatus.OK)
+                        self.assertEqual(
+                            list(response.context['page_obj']), first_page
+                        )
+        comments_url = reverse(
+            'posts:post_comments', kwargs={'post_id': post.pk}
+        )
+        for values in cursors:
+            with self.subTest(url=comments_url, values=values):
+                response = self.authorized_client.get(
+                    comments_url, {'after': encode_cursor(values)}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
 
 class CacheViewsTest(TestCase):
     @classmethod
@@ -222,7 +300,8 @@ class CacheViewsTest(TestCase):
         """Проверка кэша для index."""
         response = self.authorized_client.get(reverse('posts:index'))
         index_hashed = response.content
-        Post.objects.all().delete()
+        # update() не отправляет сигналов: страница остаётся в кэше.
+        Post.objects.all().update(text='Изменённый без сигналов текст')
         response_hashed = self.authorized_client.get(reverse('posts:index'))
         index_comparison = response_hashed.content
         self.assertEqual(index_hashed, index_comparison)
@@ -231,6 +310,131 @@ class CacheViewsTest(TestCase):
         index_updated = response.content
         self.assertNotEqual(index_comparison, index_updated)
 
+    def test_cache_invalidated_by_changes(self):
+        """Новые и удалённые посты сразу видны на закэшированных страницах."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.authorized_client.get(url)
+                new_post = Post.objects.create(
+                    text='Свежий пост', author=self.user
+                )
+                response = self.authorized_client.get(url)
+                self.assertContains(response, new_post.text)
+                new_post.delete()
+                response = self.authorized_client.get(url)
+                self.assertNotContains(response, new_post.text)
+
+    def test_cached_feed_with_personal_header(self):
+        """Лента кэшируется одна на всех, а шапка у каждого своя."""
+        other_user = User.objects.create_user(username='other_user')
+        other_client = Client()
+        other_client.force_login(other_user)
+        self.authorized_client.get(reverse('posts:index'))
+        Post.objects.all().update(text='Изменённый без сигналов текст')
+        response = other_client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.text)
+        self.assertContains(response, f'Пользователь: {other_user}')
+        self.assertNotContains(response, f'Пользователь: {self.user}')
+
+    def test_post_card_cache(self):
+        """Правка поста обновляет только его карточку."""
+        other_post = Post.objects.create(
+            text='Другой пост', author=self.user
+        )
+        self.authorized_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=other_post.pk).update(text='Без сигналов')
+        self.post.text = 'Отредактированный пост'
+        self.post.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Отредактированный пост')
+        self.assertContains(response, 'Другой пост')
+
+    def test_author_rename_updates_cached_pages(self):
+        """Смена имени автора видна на закэшированных страницах
+        и карточках его постов."""
+        author = User.objects.create_user(username='old_name')
+        Post.objects.create(text='Пост автора', author=author)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'old_name'}),
+        ]
+        for url in urls:
+            self.client.get(url)
+        author.username = 'new_name'
+        author.first_name, author.last_name = 'Новое', 'Имя'
+        author.save()
+        response = self.client.get(urls[0])
+        self.assertContains(response, 'Новое Имя')
+        self.assertContains(
+            response, reverse('posts:profile', kwargs={'username': 'new_name'})
+        )
+        self.assertEqual(
+            self.client.get(urls[1]).status_code, HTTPStatus.NOT_FOUND
+        )
+
+
+class ConditionalGetViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Thank_you')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_unchanged_pages_return_not_modified(self):
+        """Неизменившаяся страница отдаёт 304, изменившаяся — 200."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                # Первый ответ может выставить CSRF-cookie,
+                # а она входит в ETag.
+                self.authorized_client.get(url)
+                etag = self.authorized_client.get(url)['ETag']
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.post.text = f'{self.post.text}!'
+                self.post.save()
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_comment_edit_changes_post_etag(self):
+        """Правка комментария меняет ETag поста, хотя их число
+        и дата правки поста прежние."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий'
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.authorized_client.get(url)
+        etag = self.authorized_client.get(url)['ETag']
+        comment.text = 'Исправленный комментарий'
+        comment.save()
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_differs_between_users(self):
+        """У страниц разных пользователей разные ETag."""
+        url = reverse('posts:index')
+        etag = self.authorized_client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -317,3 +521,508 @@ class FollowViewsTest(TestCase):
         self.assertEqual(
             count_post_third_user_after, count_post_third_user_before
         )
+
+    def test_follow_feed_is_materialized(self):
+        """Лента подписок заполняется при подписке и публикации
+        и очищается при отписке."""
+        follow_url = reverse('posts:follow_index')
+        self.authorized_client_1.get(
+            reverse(
+                'posts:profile_follow', kwargs={'username': self.second_user}
+            )
+        )
+        new_post = Post.objects.create(
+            text='Новый пост', author=self.second_user
+        )
+        response = self.authorized_client_1.get(follow_url)
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [new_post.pk, self.post.pk]
+        )
+        response = self.authorized_client_3.get(follow_url)
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.authorized_client_1.get(
+            reverse(
+                'posts:profile_unfollow', kwargs={'username': self.second_user}
+            )
+        )
+        response = self.authorized_client_1.get(follow_url)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    @override_settings(FEED_CELEBRITY_THRESHOLD=1)
+    def test_follow_feed_pulls_celebrity_posts(self):
+        """Посты популярного автора не раскладываются по лентам,
+        но попадают в ленту подписок при чтении."""
+        self.authorized_client_1.get(
+            reverse(
+                'posts:profile_follow', kwargs={'username': self.second_user}
+            )
+        )
+        new_post = Post.objects.create(
+            text='Новый пост', author=self.second_user
+        )
+        self.assertFalse(
+            FeedItem.objects.filter(user=self.first_user).exists()
+        )
+        response = self.authorized_client_1.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [new_post.pk, self.post.pk]
+        )
+
+    @override_settings(FEED_CELEBRITY_THRESHOLD=2)
+    def test_follow_feed_numbered_pages_with_celebrity(self):
+        """Нумерованные страницы ленты подписок сливают материализованную
+        ленту с постами популярного автора."""
+        for client in (self.authorized_client_1, self.authorized_client_3):
+            client.get(
+                reverse(
+                    'posts:profile_follow',
+                    kwargs={'username': self.second_user}
+                )
+            )
+        self.authorized_client_1.get(
+            reverse(
+                'posts:profile_follow', kwargs={'username': self.third_user}
+            )
+        )
+        third_post = Post.objects.create(
+            text='Пост обычного автора', author=self.third_user
+        )
+        response = self.authorized_client_1.get(
+            reverse('posts:follow_index'), {'page': 1}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [third_post.pk, self.post.pk]
+        )
+
+    def feed_items(self, user):
+        return set(
+            FeedItem.objects.filter(user=user).values_list(
+                'post_id', flat=True
+            )
+        )
+
+    @override_settings(FEED_CELEBRITY_THRESHOLD=2)
+    def test_feeds_rebuilt_when_celebrity_threshold_crossed(self):
+        """Автор, ставший популярным, пропадает из материализованных лент,
+        а переставший — раскладывается по лентам всех подписчиков,
+        в том числе подписавшихся, пока он был популярным."""
+        profile_kwargs = {'username': self.second_user}
+        self.authorized_client_1.get(
+            reverse('posts:profile_follow', kwargs=profile_kwargs)
+        )
+        self.assertEqual(self.feed_items(self.first_user), {self.post.pk})
+        self.authorized_client_3.get(
+            reverse('posts:profile_follow', kwargs=profile_kwargs)
+        )
+        self.assertFalse(
+            FeedItem.objects.filter(post__author=self.second_user).exists()
+        )
+        new_post = Post.objects.create(
+            text='Пост популярного автора', author=self.second_user
+        )
+        self.authorized_client_1.get(
+            reverse('posts:profile_unfollow', kwargs=profile_kwargs)
+        )
+        self.assertEqual(
+            self.feed_items(self.third_user), {new_post.pk, self.post.pk}
+        )
+        response = self.authorized_client_3.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [new_post.pk, self.post.pk]
+        )
+
+
+@override_settings(FEED_ENGINE='timeline', TIMELINE_SIZE=7)
+class TimelineViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.follower = User.objects.create_user(username='follower')
+        cls.authors = [
+            User.objects.create_user(username=f'author_{number}')
+            for number in range(2)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.follower, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.follower)
+        self.posts = [
+            Post.objects.create(
+                text=f'Тестовый пост № {number}',
+                author=self.authors[number % 2]
+            ) for number in range(POSTS_FOR_PAGINATOR_TEST)
+        ]
+
+    def read_feed(self, url):
+        """Листает ленту курсорами до конца и возвращает id постов."""
+        response = self.authorized_client.get(url)
+        page_obj = response.context['page_obj']
+        post_ids = [post.pk for post in page_obj]
+        while page_obj.has_next():
+            response = self.authorized_client.get(
+                url, {'after': page_obj.next_cursor}
+            )
+            page_obj = response.context['page_obj']
+            post_ids += [post.pk for post in page_obj]
+        return post_ids
+
+    def test_follow_index_merges_author_timelines(self):
+        """Лента подписок сливается из лент авторов и дочитывается
+        из базы за пределами кэшированного окна."""
+        expected = [post.pk for post in reversed(self.posts)]
+        self.assertEqual(
+            self.read_feed(reverse('posts:follow_index')), expected
+        )
+
+    def test_profile_timeline_follows_saves_and_deletes(self):
+        """Лента автора в кэше обновляется при создании
+        и удалении постов."""
+        author = self.authors[0]
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        self.read_feed(url)
+        new_post = Post.objects.create(text='Новый пост', author=author)
+        self.assertEqual(self.read_feed(url)[0], new_post.pk)
+        new_post.delete()
+        self.assertEqual(
+            self.read_feed(url),
+            [
+                post.pk for post in reversed(self.posts)
+                if post.author == author
+            ]
+        )
+
+    @override_settings(FEED_ENGINE='push')
+    def test_profile_skips_timeline_cache_for_push_engine(self):
+        """Без движка timeline профиль читает посты из базы,
+        а не из кэшированной ленты автора."""
+        author = self.authors[0]
+        cache.set(
+            TIMELINE_KEY.format(author.pk), {'items': [], 'complete': True}
+        )
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        self.assertEqual(
+            self.read_feed(url),
+            [
+                post.pk for post in reversed(self.posts)
+                if post.author == author
+            ]
+        )
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.post = Post.objects.create(
+            text='Кошка спит на диване', author=cls.user
+        )
+        cls.commented_post = Post.objects.create(
+            text='Фотография дивана', author=cls.user
+        )
+        Comment.objects.create(
+            post=cls.commented_post, author=cls.user, text='Где же кошка?'
+        )
+        Post.objects.create(text='Собака гуляет', author=cls.user)
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_search_ranks_posts_and_comments(self):
+        """Находятся посты по тексту и комментариям, текст важнее."""
+        self.assertEqual(
+            self.search('КОШКА'), [self.post.pk, self.commented_post.pk]
+        )
+        self.assertEqual(self.search('кошка диване'), [self.post.pk])
+        self.assertEqual(self.search('попугай'), [])
+
+    def test_search_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        post = Post.objects.create(text='Старый текст', author=self.user)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(self.search('старый'), [])
+        self.assertEqual(self.search('новый'), [post.pk])
+        post.delete()
+        self.assertEqual(self.search('новый'), [])
+
+    def test_search_query_syntax_is_escaped(self):
+        """Операторы FTS5 во вводе не ломают запрос."""
+        for query in ('"кошка', 'кошка OR собака', 'NEAR(*', '***'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': query}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_admin_search_returns_all_matches(self):
+        """Поиск в админке по индексу находит все подходящие посты."""
+        parrots = [
+            Post.objects.create(text=f'Попугай {number}', author=self.user)
+            for number in range(3)
+        ]
+        found, _ = PostAdmin(Post, admin.site).get_search_results(
+            None, Post.objects.all(), 'попугай'
+        )
+        self.assertEqual(
+            sorted(post.pk for post in found),
+            [post.pk for post in parrots]
+        )
+
+    def test_search_keyset_pages(self):
+        """Результаты листаются курсорами вместе с запросом."""
+        Post.objects.bulk_create(
+            Post(text=f'Попугай № {number}', author=self.user)
+            for number in range(POSTS_FOR_PAGINATOR_TEST)
+        )
+        response = self.client.get(reverse('posts:search'), {'q': 'попугай'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), POSTS_PER_PAGE)
+        self.assertContains(response, f'after={page_obj.next_cursor}')
+        self.assertContains(response, 'q=%D0%BF%D0%BE%D0%BF')
+        second_page = self.search('попугай', after=page_obj.next_cursor)
+        self.assertEqual(len(second_page), POSTS_PER_PAGE_SECOND)
+        self.assertFalse({post.pk for post in page_obj} & set(second_page))
+
+
+@override_settings(AUTOCOMPLETE_LIMIT=3)
+class AutocompleteViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo_tolstoy')
+        cls.group = Group.objects.create(
+            title='Лев и другие коты',
+            slug='lions',
+            description='Тестовая группа'
+        )
+
+    def complete(self, query, **params):
+        response = self.client.get(
+            reverse('posts:autocomplete'), {'q': query, **params}
+        )
+        return [item['url'] for item in response.json()['results']]
+
+    def test_autocomplete_users_and_groups(self):
+        """Подсказки по префиксу имени, slug и слов названия группы."""
+        profile = reverse('posts:profile', args=[self.user.username])
+        group = reverse('posts:group_list', args=[self.group.slug])
+        self.assertEqual(self.complete('LEO'), [profile])
+        self.assertEqual(self.complete('li'), [group])
+        self.assertEqual(self.complete('кот'), [group])
+        self.assertEqual(self.complete('лев'), [group])
+        self.assertEqual(self.complete(''), [])
+        self.assertEqual(self.complete('кошки'), [])
+
+    def test_autocomplete_follows_changes(self):
+        """Индекс обновляется при сохранении и удалении."""
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'tigers'
+        group.save()
+        self.assertEqual(self.complete('lions'), [])
+        self.assertEqual(
+            self.complete('tig'),
+            [reverse('posts:group_list', args=['tigers'])]
+        )
+        group.delete()
+        self.assertEqual(self.complete('tig'), [])
+
+    def test_autocomplete_limit(self):
+        """Число подсказок ограничено ?limit= и AUTOCOMPLETE_LIMIT."""
+        for number in range(5):
+            User.objects.create_user(username=f'leo_{number}')
+        self.assertEqual(len(self.complete('leo')), 3)
+        self.assertEqual(len(self.complete('leo', limit=2)), 2)
+        self.assertEqual(len(self.complete('leo', limit=100)), 3)
+
+
+class CommentsViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader_{number}'),
+                text=f'Комментарий № {number}'
+            ) for number in range(COMMENTS_PER_PAGE + 5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_are_paginated(self):
+        """На странице поста первые комментарии, дальше — по курсору."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        first_page = response.context['comments']
+        self.assertEqual(
+            [comment.pk for comment in first_page],
+            [comment.pk for comment in self.comments[:COMMENTS_PER_PAGE]]
+        )
+        more_url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk}
+        )
+        self.assertContains(
+            response, f'{more_url}?after={first_page.next_cursor}'
+        )
+        response = self.client.get(
+            more_url, {'after': first_page.next_cursor}
+        )
+        self.assertEqual(
+            [comment.pk for comment in response.context['comments']],
+            [comment.pk for comment in self.comments[COMMENTS_PER_PAGE:]]
+        )
+        self.assertNotContains(response, '<main>')
+
+    def test_load_more_script_included(self):
+        """Страница поста подключает скрипт, который подгружает
+        комментарии по data-url."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertContains(response, 'data-url=')
+        self.assertContains(response, static('js/comments.js'))
+        self.assertTrue(os.path.isfile(
+            os.path.join(settings.BASE_DIR, 'static', 'js', 'comments.js')
+        ))
+
+    def test_comments_without_n_plus_one(self):
+        """Авторы комментариев читаются тем же запросом."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        # Проверка поста (ETag и существование) и сами комментарии.
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+    def test_comments_of_missing_post(self):
+        url = reverse('posts:post_comments', kwargs={'post_id': 0})
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.NOT_FOUND
+        )
+
+
+def make_image(name='photo.jpg', color='red'):
+    content = BytesIO()
+    Image.new('RGB', (1200, 600), color).save(content, 'JPEG')
+    return SimpleUploadedFile(name, content.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailViewsTest(TestCase):
+    PLACEHOLDER = 'Картинка обрабатывается'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='photographer')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой', author=cls.user
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(THUMBNAIL_WORKER='command')
+    def test_placeholder_until_thumbnails_generated(self):
+        """Страницы не делают миниатюры сами: до фоновой обработки
+        вместо картинки заглушка, после — готовая миниатюра."""
+        # Своя картинка: у одинаковых файлов общие и миниатюры.
+        image = PostImage.objects.create(
+            post=self.post, image=make_image('pending.jpg', 'purple')
+        )
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ):
+            self.assertContains(self.client.get(url), self.PLACEHOLDER)
+        thumbnail = thumbnail_file(image.image, 'card')
+        self.assertFalse(thumbnail.exists())
+
+        call_command('generate_thumbnails', stdout=StringIO())
+        image.refresh_from_db()
+        self.assertTrue(image.thumbnails_ready)
+        self.assertTrue(thumbnail.exists())
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, self.PLACEHOLDER)
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_thumbnails_generated_on_save(self):
+        """В режиме sync миниатюры готовы сразу после сохранения."""
+        image = PostImage.objects.create(post=self.post, image=make_image())
+        image.refresh_from_db()
+        self.assertTrue(image.thumbnails_ready)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertContains(response, f'src="{settings.MEDIA_URL}cache/')
+
+    def test_responsive_variants(self):
+        """Карточка предлагает WebP и исходный формат нескольких ширин;
+        ширины больше исходной картинки не делаются."""
+        image = PostImage.objects.create(post=self.post, image=make_image())
+        for fmt in (None, 'WEBP'):
+            self.assertTrue(
+                thumbnail_file(image.image, 'card', 480, fmt).exists()
+            )
+        self.assertFalse(
+            thumbnail_file(image.image, 'card', 1440, 'WEBP').exists()
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, '.webp 480w')
+        self.assertContains(response, '.jpg 960w')
+        self.assertNotContains(response, '1440w')
+
+    @override_settings(THUMBNAIL_WORKER='command')
+    def test_new_file_queues_thumbnails_again(self):
+        image = PostImage.objects.create(post=self.post, image=make_image())
+        call_command('generate_thumbnails', stdout=StringIO())
+        image.refresh_from_db()
+        image.image = make_image('other.jpg', 'blue')
+        image.save()
+        image.refresh_from_db()
+        self.assertFalse(image.thumbnails_ready)
+
+    def test_page_thumbnails_read_in_batch(self):
+        """Картинки страницы — одним запросом, миниатюры — одним
+        чтением хранилища sorl, сколько бы постов ни было."""
+        posts = [self.post] + [
+            Post.objects.create(text=f'Пост {index}', author=self.user)
+            for index in range(3)
+        ]
+        for index, post in enumerate(posts):
+            PostImage.objects.create(
+                post=post, image=make_image(f'batch{index}.jpg')
+            )
+        PostImage.objects.create(post=posts[0], image=make_image('extra.jpg'))
+        cache.clear()
+        page = KeysetPage(list(Post.objects.filter(author=self.user)))
+        # Картинки и промахи кэша sorl в таблице KVStore.
+        with self.assertNumQueries(2):
+            attach_thumbnails(page)
+        urls = [
+            image.thumbnails['card'].url
+            for post in page for image in post.image.all()
+        ]
+        self.assertEqual(len(urls), 5)
+        self.assertTrue(all(urls))
+        page = KeysetPage(list(Post.objects.filter(author=self.user)))
+        with self.assertNumQueries(1):
+            attach_thumbnails(page)
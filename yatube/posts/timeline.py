@@ -0,0 +1,158 @@
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Post
+from .utils import (decode_cursor, FEED_ORDERING, keyset_pagination,
+                    make_keyset_page, numbered_pages_requested, paginate)
+
+TIMELINE_KEY = 'timeline:author:{}'
+
+
+def _timeline_key(author_id):
+    return TIMELINE_KEY.format(author_id)
+
+
+def _load_timeline(author_id):
+    items = list(
+        Post.objects.filter(author_id=author_id).order_by(
+            *FEED_ORDERING
+        ).values_list('created', 'pk')[:settings.TIMELINE_SIZE]
+    )
+    # Короткий список содержит все посты автора, полный мог быть обрезан.
+    return {'items': items, 'complete': len(items) < settings.TIMELINE_SIZE}
+
+
+def author_timelines(author_ids):
+    """Кэшированные ленты авторов: {author_id: {'items', 'complete'}}.
+
+    items — пары (created, pk) последних постов, от новых к старым.
+    Отсутствующие в кэше ленты читаются из базы и кладутся в кэш.
+    """
+    keys = {_timeline_key(author_id): author_id for author_id in author_ids}
+    cached = cache.get_many(keys)
+    timelines = {keys[key]: value for key, value in cached.items()}
+    missing = {
+        key: _load_timeline(author_id)
+        for key, author_id in keys.items() if author_id not in timelines
+    }
+    if missing:
+        cache.set_many(missing, settings.TIMELINE_CACHE_TIMEOUT)
+        timelines.update(
+            (keys[key], value) for key, value in missing.items()
+        )
+    return timelines
+
+
+def push_to_timeline(post):
+    """Добавляет новый пост в кэшированную ленту автора, если она есть."""
+    key = _timeline_key(post.author_id)
+    timeline = cache.get(key)
+    if timeline is None:
+        return
+    items = sorted(
+        timeline['items'] + [(post.created, post.pk)], reverse=True
+    )
+    if len(items) > settings.TIMELINE_SIZE:
+        items = items[:settings.TIMELINE_SIZE]
+        timeline['complete'] = False
+    timeline['items'] = items
+    cache.set(key, timeline, settings.TIMELINE_CACHE_TIMEOUT)
+
+
+def drop_timeline(author_id):
+    """Сбрасывает ленту автора: она перечитается из базы при обращении."""
+    cache.delete(_timeline_key(author_id))
+
+
+def _parse_cursor(token):
+    values = decode_cursor(token)
+    return None if values is None else tuple(values)
+
+
+def _merged_keys(timelines, after, before, limit):
+    """limit ключей (created, pk) после курсора из слияния лент авторов.
+
+    Возвращает None, если ответ выходит за пределы закэшированных
+    окон и страницу нужно читать из базы.
+    """
+    # Старше самого нового «хвоста» обрезанных лент данные неполны.
+    horizon = max(
+        (
+            timeline['items'][-1] for timeline in timelines
+            if not timeline['complete']
+        ),
+        default=None,
+    )
+    if before is not None:
+        if horizon is not None and before < horizon:
+            return None
+        newer = heapq.merge(
+            *(
+                reversed(timeline['items']) for timeline in timelines
+            )
+        )
+        keys = [key for key in newer if key > before]
+        return keys[:limit]
+    keys = []
+    for key in heapq.merge(
+        *(timeline['items'] for timeline in timelines), reverse=True
+    ):
+        if after is not None and key >= after:
+            continue
+        if horizon is not None and key < horizon:
+            return None
+        keys.append(key)
+        if len(keys) == limit:
+            return keys
+    return keys if horizon is None else None
+
+
+def author_sources(author_ids):
+    """Посты авторов author_ids: по источнику на автора.
+
+    Каждый читается по индексу (author, created) с LIMIT, и источники
+    сливаются heapq.merge вместо сортировки всех постов всех авторов.
+    """
+    return [
+        Post.objects.filter(author_id=author_id).select_related(
+            'author', 'group'
+        )
+        for author_id in author_ids
+    ]
+
+
+def timeline_page(request, author_ids, post_per_page):
+    """Страница ленты постов авторов author_ids из кэша их лент.
+
+    Ленты сливаются heapq.merge без SQL-соединений; за пределами
+    закэшированного окна и для нумерованных страниц лента читается
+    из базы обычной курсорной пагинацией с теми же курсорами.
+    """
+    posts = Post.objects.filter(
+        author_id__in=author_ids
+    ).select_related('author', 'group')
+    if numbered_pages_requested(request):
+        return paginate(request, posts, post_per_page)
+    after = _parse_cursor(request.GET.get('after'))
+    before = _parse_cursor(request.GET.get('before'))
+    keys = _merged_keys(
+        list(author_timelines(author_ids).values()),
+        after,
+        before,
+        post_per_page + 1,
+    )
+    if keys is None:
+        return keyset_pagination(
+            request, author_sources(author_ids), post_per_page
+        )
+    found = posts.in_bulk([pk for created, pk in keys])
+    rows = [found[pk] for created, pk in keys if pk in found]
+    return make_keyset_page(
+        rows,
+        post_per_page,
+        FEED_ORDERING,
+        before is not None,
+        before is not None or after is not None,
+    )
@@ -0,0 +1,143 @@
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+from .images import draft_jpeg, MIME_TYPES
+
+# Сколько начальных байтов файла держать, пока в них ищется заголовок
+# картинки: у JPEG перед размерами идут EXIF и другие сегменты.
+HEADER_PEEK_SIZE = 256 * 1024
+# Качество, с которым пересохраняется уменьшенный оригинал.
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+def read_header(data):
+    """Формат и размеры картинки по её началу, без декодирования.
+
+    Возвращает None, если заголовок ещё не дочитан или это не картинка.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+    except Exception:
+        return None
+    return image.format, image.size
+
+
+def check_image(fmt, size):
+    """Текст ошибки для картинки формата fmt и размеров size или None."""
+    if fmt not in MIME_TYPES:
+        return 'Поддерживаются картинки JPEG, PNG, GIF и WebP.'
+    width, height = size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        return 'Картинка больше {} Мпикс.'.format(
+            settings.POST_IMAGE_MAX_PIXELS // 10 ** 6
+        )
+    return None
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Проверяет картинки прямо во время загрузки.
+
+    Сам данные не хранит, а передаёт следующим обработчикам (большие
+    файлы Django пишет во временный файл). Файл отбрасывается, как
+    только превысит POST_IMAGE_MAX_UPLOAD_SIZE или как только по его
+    началу видно, что это не картинка или в ней слишком много пикселей;
+    причина попадает в request.upload_errors[имя поля].
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.checked = False
+        if (self.content_length or 0) > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.reject(self.too_large())
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.reject(self.too_large())
+        if not self.checked:
+            self.check_header(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Файл сохраняет следующий обработчик; нечитаемый заголовок
+        # короткого файла отклонит проверка формы.
+        return None
+
+    def check_header(self, raw_data):
+        self.header += raw_data
+        header = read_header(self.header)
+        if header is None:
+            if len(self.header) >= HEADER_PEEK_SIZE:
+                self.reject('Загрузите правильное изображение.')
+            return
+        self.checked = True
+        self.header = b''
+        error = check_image(*header)
+        if error:
+            self.reject(error)
+
+    def reject(self, message):
+        self.request.upload_errors[self.field_name] = message
+        raise SkipFile(message)
+
+    @staticmethod
+    def too_large():
+        return 'Файл больше {} МБ.'.format(
+            settings.POST_IMAGE_MAX_UPLOAD_SIZE // 2 ** 20
+        )
+
+
+def limit_image_uploads(view):
+    """Ставит ImageUploadHandler первым обработчиком загрузки view.
+
+    Обработчики можно поменять только до первого чтения request.POST,
+    а его читает проверка CSRF в middleware, поэтому проверка
+    переносится внутрь, после замены обработчиков.
+    """
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_errors = {}
+        request.upload_handlers.insert(0, ImageUploadHandler(request))
+        return protected(request, *args, **kwargs)
+    return csrf_exempt(wrapper)
+
+
+def downscale_image(uploaded):
+    """Уменьшает оригинал до POST_IMAGE_MAX_SIDE по длинной стороне.
+
+    JPEG читается в режиме draft: декодер сразу уменьшает картинку
+    в 2–8 раз, и полный размер в память не попадает. Картинки меньше
+    предела и анимации (уменьшение потеряло бы кадры) не меняются.
+    """
+    limit = settings.POST_IMAGE_MAX_SIDE
+    uploaded.seek(0)
+    image = Image.open(uploaded)
+    fmt = image.format
+    if (max(image.size) <= limit or getattr(image, 'is_animated', False)
+            or fmt not in SAVE_OPTIONS):
+        uploaded.seek(0)
+        return uploaded
+    draft_jpeg(image, limit / max(image.size))
+    # Поворот из EXIF применяем сразу: метаданные при пересохранении
+    # не переносятся.
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((limit, limit), Image.LANCZOS)
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    output = BytesIO()
+    image.save(output, fmt, **SAVE_OPTIONS[fmt])
+    return ContentFile(output.getvalue(), name=uploaded.name)
@@ -4,6 +4,26 @@ from . import views
 
 app_name = 'posts'
 
+# Наибольшее число SQL-запросов на запрос к view, с пустым кэшем
+# (core.middleware.QueryBudgetMiddleware). Бюджеты создания постов
+# и подписок учитывают первую запись счётчиков автора, создания и правки
+# поста — новую картинку и счётчики ссылок на файлы (MediaBlob).
+QUERY_BUDGETS = {
+    'index': 5,
+    'group_list': 6,
+    'profile': 8,
+    'post_detail': 7,
+    'post_comments': 6,
+    'follow_index': 7,
+    'search': 5,
+    'autocomplete': 2,
+    'post_create': 17,
+    'post_edit': 14,
+    'add_comment': 6,
+    'profile_follow': 16,
+    'profile_unfollow': 12,
+}
+
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
@@ -11,10 +31,17 @@ urlpatterns = [
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -1,4 +1,23 @@
+import base64
+import binascii
+import datetime
+import heapq
+import json
+
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+POSTS_PER_PAGE = 10
+# Страницы сбрасываются сигналами при изменении данных (posts.caching),
+# поэтому время жизни в кэше может быть долгим.
+SAVE_VALUE_IN_CACHE = 60 * 60 * 24
+# Порядок лент: сначала новые, при равной дате — больший id.
+FEED_ORDERING = ('-created', '-pk')
+COMMENTS_PER_PAGE = 20
+COMMENTS_ORDERING = ('created', 'pk')
 
 
 def pagination_pages(request, post, post_per_page):
@@ -8,5 +27,232 @@ def pagination_pages(request, post, post_per_page):
     return page_obj
 
 
-POSTS_PER_PAGE = 10
-SAVE_VALUE_IN_CACHE = 20
+class KeysetPage:
+    """Страница курсорной пагинации.
+
+    Повторяет интерфейс django.core.paginator.Page в той части,
+    которой пользуются шаблоны, но вместо номеров страниц
+    хранит непрозрачные курсоры соседних страниц.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<KeysetPage: {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        # isoformat без усечения микросекунд, иначе курсор «съест» записи.
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключей сортировки в строку для URL."""
+    raw = json.dumps([_encode_value(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def parse_cursor_datetime(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        value = parse_datetime(value)
+    except ValueError:
+        return None
+    # Наивную дату нельзя сравнить с датами из базы при USE_TZ.
+    if value is None or timezone.is_aware(value) != settings.USE_TZ:
+        return None
+    return value
+
+
+def parse_cursor_int(value):
+    # bool — подкласс int; числа вне 64 бит база не примет.
+    if (isinstance(value, int) and not isinstance(value, bool)
+            and -2 ** 63 <= value < 2 ** 63):
+        return value
+    return None
+
+
+# Разбор значений курсора лент: дата создания и id.
+FEED_CURSOR_PARSERS = (parse_cursor_datetime, parse_cursor_int)
+
+
+def decode_cursor(token, parsers=FEED_CURSOR_PARSERS):
+    """Распаковывает курсор и разбирает значения функциями parsers.
+
+    Для испорченного курсора (в том числе со значениями не того типа)
+    возвращает None, как будто курсора нет.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != len(parsers):
+        return None
+    values = [parse(value) for parse, value in zip(parsers, values)]
+    if any(value is None for value in values):
+        return None
+    return values
+
+
+def _field(key):
+    return key.lstrip('-')
+
+
+def reverse_ordering(ordering):
+    return tuple(
+        _field(key) if key.startswith('-') else f'-{key}' for key in ordering
+    )
+
+
+def keyset_filter(ordering, values):
+    """Условие «строго после курсора» для порядка ordering.
+
+    Первое условие задаёт диапазон по ведущему ключу, чтобы база
+    могла пройти по индексу, остальные добивают равные значения.
+    """
+    first = ordering[0]
+    bound = 'lte' if first.startswith('-') else 'gte'
+    condition = Q()
+    for index, key in enumerate(ordering):
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        equal = {
+            _field(previous): value
+            for previous, value in zip(ordering[:index], values)
+        }
+        equal[f'{_field(key)}__{lookup}'] = values[index]
+        condition |= Q(**equal)
+    return Q(**{f'{_field(first)}__{bound}': values[0]}) & condition
+
+
+def cursor_values(obj, ordering):
+    return [getattr(obj, _field(key)) for key in ordering]
+
+
+def _keyset_rows(posts, ordering, cursor, limit):
+    if cursor is not None:
+        posts = posts.filter(keyset_filter(ordering, cursor))
+    return posts.order_by(*ordering)[:limit]
+
+
+def _merged_rows(sources, ordering, cursor, limit):
+    """Первые limit записей после курсора из одного или нескольких источников.
+
+    Каждый источник читается своим запросом с LIMIT, результаты сливаются
+    heapq.merge; все ключи ordering должны идти в одном направлении.
+    Запись, найденная в нескольких источниках, попадает на страницу один раз.
+    """
+    if isinstance(sources, QuerySet):
+        return list(_keyset_rows(sources, ordering, cursor, limit))
+    merged = heapq.merge(
+        *(
+            _keyset_rows(source, ordering, cursor, limit)
+            for source in sources
+        ),
+        key=lambda obj: cursor_values(obj, ordering),
+        reverse=ordering[0].startswith('-'),
+    )
+    rows, seen = [], set()
+    for obj in merged:
+        if obj.pk in seen:
+            continue
+        seen.add(obj.pk)
+        rows.append(obj)
+        if len(rows) == limit:
+            break
+    return rows
+
+
+def make_keyset_page(rows, post_per_page, ordering, backwards, from_cursor):
+    """Собирает страницу из post_per_page + 1 записей, прочитанных от курсора.
+
+    Лишняя запись только сообщает, что за страницей есть ещё записи;
+    при чтении назад (?before=) записи приходят в обратном порядке.
+    """
+    if backwards:
+        has_previous = len(rows) > post_per_page
+        rows = rows[:post_per_page][::-1]
+        has_next = bool(rows)
+    else:
+        has_next = len(rows) > post_per_page
+        rows = rows[:post_per_page]
+        has_previous = from_cursor and bool(rows)
+    return KeysetPage(
+        rows,
+        next_cursor=(
+            encode_cursor(cursor_values(rows[-1], ordering))
+            if has_next else None
+        ),
+        previous_cursor=(
+            encode_cursor(cursor_values(rows[0], ordering))
+            if has_previous else None
+        ),
+    )
+
+
+def keyset_pagination(request, posts, post_per_page, ordering=FEED_ORDERING):
+    """Курсорная пагинация без OFFSET и COUNT(*).
+
+    ?after=<курсор> — записи старше курсора, ?before=<курсор> — новее.
+    posts — QuerySet или список QuerySet-ов, которые сливаются в одну ленту;
+    каждый читается одним запросом с LIMIT по индексу ключей ordering.
+    """
+    after = decode_cursor(request.GET.get('after'))
+    before = decode_cursor(request.GET.get('before'))
+    if before is not None:
+        rows = _merged_rows(
+            posts, reverse_ordering(ordering), before, post_per_page + 1
+        )
+        return make_keyset_page(rows, post_per_page, ordering, True, True)
+    rows = _merged_rows(posts, ordering, after, post_per_page + 1)
+    return make_keyset_page(
+        rows, post_per_page, ordering, False, after is not None
+    )
+
+
+def numbered_pages_requested(request):
+    return settings.POSTS_NUMBERED_PAGINATION or 'page' in request.GET
+
+
+def paginate(request, posts, post_per_page, ordering=FEED_ORDERING):
+    """Пагинация лент.
+
+    По умолчанию курсорная; нумерованные страницы включаются
+    параметром ?page=N или настройкой POSTS_NUMBERED_PAGINATION.
+    """
+    if numbered_pages_requested(request):
+        if not isinstance(posts, QuerySet):
+            # Порядок из Meta.ordering в частях UNION запрещён.
+            sources = [source.order_by() for source in posts]
+            posts = sources[0].union(*sources[1:])
+        return pagination_pages(
+            request, posts.order_by(*ordering), post_per_page
+        )
+    return keyset_pagination(request, posts, post_per_page, ordering)
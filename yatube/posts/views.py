@@ -1,43 +1,95 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
 
 
+from .autocomplete import autocomplete_limit, complete
+from .caching import (cache_anonymous_page, generation_etag, post_etag,
+                      render_cached)
+from .counters import get_stats
+from .feed import follow_feed, FOLLOW_FEED_ORDERING
 from .forms import PostForm, CommentForm
-from .models import Follow, Group, Post, User
-from .utils import pagination_pages, POSTS_PER_PAGE, SAVE_VALUE_IN_CACHE
+from .images import attach_thumbnails
+from .models import Comment, Follow, Group, Post, User
+from .search import search_posts
+from .timeline import timeline_page
+from .uploads import limit_image_uploads
+from .utils import (COMMENTS_ORDERING, COMMENTS_PER_PAGE, keyset_pagination,
+                    paginate, POSTS_PER_PAGE, SAVE_VALUE_IN_CACHE)
 
 
-@cache_page(SAVE_VALUE_IN_CACHE, key_prefix='index_page')
+@condition(etag_func=generation_etag('index'))
+@cache_anonymous_page(SAVE_VALUE_IN_CACHE, 'index')
 def index(request):
-    posts = Post.objects.select_related('author', 'group')
-    page_obj = pagination_pages(request, posts, POSTS_PER_PAGE)
+    def get_context():
+        posts = Post.objects.select_related('author', 'group')
+        return {
+            'page_obj': attach_thumbnails(
+                paginate(request, posts, POSTS_PER_PAGE)
+            )
+        }
+
+    post_list = render_cached(
+        request, 'index', ['index'], 'posts/post_list.html',
+        get_context, SAVE_VALUE_IN_CACHE
+    )
     title = 'Последние обновления на сайте'
     template = 'posts/index.html'
     context = {
-        'page_obj': page_obj,
+        'post_list': post_list,
         'title': title
     }
     return render(request, template, context)
 
 
+@condition(etag_func=generation_etag('group:{slug}'))
+@cache_anonymous_page(SAVE_VALUE_IN_CACHE, 'group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author', 'group')
-    page_obj = pagination_pages(request, posts, POSTS_PER_PAGE)
+
+    def get_context():
+        posts = group.posts.select_related('author', 'group')
+        return {
+            'page_obj': attach_thumbnails(
+                paginate(request, posts, POSTS_PER_PAGE)
+            )
+        }
+
+    post_list = render_cached(
+        request, 'group_posts', [f'group:{slug}'], 'posts/post_list.html',
+        get_context, SAVE_VALUE_IN_CACHE
+    )
     template = 'posts/group_list.html'
     context = {
         'group': group,
-        'page_obj': page_obj,
+        'post_list': post_list,
     }
     return render(request, template, context)
 
 
+@condition(etag_func=generation_etag('profile:{username}'))
+@cache_anonymous_page(SAVE_VALUE_IN_CACHE, 'profile:{username}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    count = posts.count()
-    page_obj = pagination_pages(request, posts, POSTS_PER_PAGE)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = get_stats(author)
+
+    def get_context():
+        if settings.FEED_ENGINE == 'timeline':
+            page_obj = timeline_page(request, [author.pk], POSTS_PER_PAGE)
+        else:
+            posts = author.posts.select_related('author', 'group')
+            page_obj = paginate(request, posts, POSTS_PER_PAGE)
+        return {'page_obj': attach_thumbnails(page_obj)}
+
+    post_list = render_cached(
+        request, 'profile', [f'profile:{username}'],
+        'posts/post_list.html', get_context, SAVE_VALUE_IN_CACHE
+    )
     template = 'posts/profile.html'
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
@@ -45,38 +97,74 @@ def profile(request, username):
     ).exists()
     context = {
         'author': author,
-        'page_obj': page_obj,
-        'count': count,
+        'post_list': post_list,
+        'count': stats.posts_count,
+        'stats': stats,
         'following': following
     }
     return render(request, template, context)
 
 
+def render_comments(request, name, post_id):
+    """Страница комментариев поста: курсором ?after= от старых к новым."""
+    def get_context():
+        comments = Comment.objects.filter(
+            post_id=post_id
+        ).select_related('author')
+        return {
+            'post_id': post_id,
+            'comments': keyset_pagination(
+                request, comments, COMMENTS_PER_PAGE, COMMENTS_ORDERING
+            ),
+        }
+
+    return render_cached(
+        request, name, [f'post:{post_id}'], 'posts/comments.html',
+        get_context, SAVE_VALUE_IN_CACHE
+    )
+
+
+@condition(etag_func=post_etag)
+@cache_anonymous_page(SAVE_VALUE_IN_CACHE, 'post:{post_id}')
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    author = post.author
-    count = author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    count = get_stats(post.author).posts_count
+
+    comment_list = render_comments(request, 'post_detail', post_id)
     template = 'posts/post_detail.html'
-    comments = post.comments.all()
     form = CommentForm()
     context = {
         'post': post,
         'count': count,
         'form': form,
-        'comments': comments
+        'comment_list': comment_list
     }
     return render(request, template, context)
 
 
+@condition(etag_func=post_etag)
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return HttpResponse(render_comments(request, 'post_comments', post_id))
+
+
 @login_required
+@limit_image_uploads
 def post_create(request):
-    form = PostForm(request.POST or None, files=request.FILES or None)
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None,
+        upload_errors=request.upload_errors
+    )
     template = 'posts/create_post.html'
     if form.is_valid():
-        form = form.save(commit=False)
-        form.author = request.user
-        form.save()
-        return redirect('posts:profile', form.author)
+        form.instance.author = request.user
+        post = form.save()
+        return redirect('posts:profile', post.author)
     context = {
         'form': form
     }
@@ -84,16 +172,18 @@ def post_create(request):
 
 
 @login_required
+@limit_image_uploads
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post.id)
     template = 'posts/create_post.html'
     is_edit = True
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        upload_errors=request.upload_errors
     )
     context = {
         'form': form,
@@ -119,15 +209,44 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = pagination_pages(request, posts, POSTS_PER_PAGE)
+    if settings.FEED_ENGINE == 'timeline':
+        authors = Follow.objects.filter(
+            user=request.user
+        ).values_list('author_id', flat=True)
+        page_obj = timeline_page(request, list(authors), POSTS_PER_PAGE)
+    else:
+        posts = follow_feed(request.user)
+        page_obj = paginate(
+            request, posts, POSTS_PER_PAGE, ordering=FOLLOW_FEED_ORDERING
+        )
     template = 'posts/follow.html'
     context = {
-        'page_obj': page_obj
+        'page_obj': attach_thumbnails(page_obj)
     }
     return render(request, template, context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    template = 'posts/search.html'
+    context = {
+        'query': query,
+        'page_obj': attach_thumbnails(
+            search_posts(request, query, POSTS_PER_PAGE)
+        ),
+        # Курсоры страниц дописываются к строке запроса.
+        'page_params': urlencode({'q': query}) + '&',
+    }
+    return render(request, template, context)
+
+
+def autocomplete(request):
+    limit = autocomplete_limit(request.GET.get('limit'))
+    return JsonResponse(
+        {'results': complete(request.GET.get('q', ''), limit)}
+    )
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
@@ -147,8 +266,8 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).delete()
+    for follow in Follow.objects.filter(user=request.user, author=author):
+        # Сигналам нужны оба пользователя, они уже загружены.
+        follow.user, follow.author = request.user, author
+        follow.delete()
     return redirect('posts:profile', author)
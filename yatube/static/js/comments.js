@@ -0,0 +1,29 @@
+// Кнопка «Показать ещё» под комментариями: следующая порция
+// подгружается с адреса из data-url и встаёт на место кнопки.
+// Без JavaScript (или при ошибке) ссылка открывает страницу поста.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('a[data-url]');
+  if (!link || !window.fetch) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.url, {credentials: 'same-origin'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      var batch = document.createElement('template');
+      batch.innerHTML = html;
+      // Ссылка на первые комментарии нужна только на отдельной странице.
+      batch.content.querySelectorAll('[data-first-page]').forEach(
+        function (node) { node.remove(); }
+      );
+      link.replaceWith(batch.content);
+    })
+    .catch(function () {
+      window.location = link.href;
+    });
+});
@@ -34,6 +34,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,7 +55,8 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, который замеряет время рендеринга.
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -137,6 +140,144 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Файлы MEDIA_ROOT, содержимое которых по этому имени никогда не меняется:
+# картинки постов названы хешем содержимого (posts.storage), миниатюры
+# sorl — хешем исходника и опций. Их отдают с Cache-Control: immutable;
+# веб-сервер перед Django должен делать то же для тех же путей.
+MEDIA_IMMUTABLE_PATTERNS = (
+    r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$',
+    r'^cache/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}\.\w+$',
+)
+MEDIA_IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Ленты листаются курсорами (?after=/?before=); True вернёт нумерацию страниц.
+POSTS_NUMBERED_PAGINATION = False
+
+# Сколько последних постов автора попадает в ленту при подписке на него.
+FEED_BACKFILL_SIZE = 1000
+# С этого числа подписчиков посты автора не раскладываются по лентам,
+# а подмешиваются в ленту подписок при её чтении.
+FEED_CELEBRITY_THRESHOLD = 10000
+# Движок ленты подписок: 'push' — материализованная лента,
+# 'timeline' — слияние кэшированных лент авторов (нужен общий для
+# всех процессов кэш, например Memcached или Redis).
+FEED_ENGINE = 'push'
+# Сколько последних постов автора хранится в его кэшированной ленте.
+TIMELINE_SIZE = 200
+TIMELINE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Кэш страниц (posts.caching): сколько секунд после истечения срока
+# ещё хранится устаревшая копия, которую отдают, пока страницу
+# пересобирает один процесс.
+PAGE_CACHE_STALE_TIMEOUT = 60 * 60
+# Время жизни блокировки пересборки и сколько ждать чужой пересборки,
+# если устаревшей копии нет.
+PAGE_CACHE_LOCK_TIMEOUT = 30
+PAGE_CACHE_LOCK_WAIT = 2
+# Вероятностное досрочное обновление (XFetch); 0 — выключено.
+PAGE_CACHE_EARLY_RECOMPUTE_BETA = 0
+# Сколько секунд страницы кэшируются, если кэш локальный для процесса
+# (LocMemCache): сброс кэша в одном процессе не виден другим. С общим
+# кэшем (Memcached, Redis) страницы живут, пока не изменятся данные.
+PAGE_CACHE_LOCAL_TIMEOUT = 60
+
+# Наибольшее число подсказок автодополнения в одном ответе.
+AUTOCOMPLETE_LIMIT = 10
+
+# Миниатюры картинок постов (sorl-thumbnail): имя размера — геометрия
+# и опции. Их заранее делает фоновый обработчик (posts.tasks), шаблоны
+# только читают готовые. widths — ширины для srcset (высота в пропорции
+# geometry), formats — форматы в дополнение к формату исходной картинки.
+# После изменения: manage.py generate_thumbnails --all.
+POST_IMAGE_THUMBNAILS = {
+    'card': {
+        'geometry': '960x339',
+        'crop': 'center',
+        'upscale': True,
+        'widths': (480, 960, 1440),
+        'formats': ('WEBP',),
+    },
+}
+# Движок sorl: JPEG декодируется сразу уменьшенным (draft).
+THUMBNAIL_ENGINE = 'posts.images.DraftEngine'
+# Загрузка картинок постов (posts.uploads): предельный размер файла
+# и число пикселей проверяются, пока файл ещё загружается; оригинал
+# длиннее POST_IMAGE_MAX_SIDE по любой стороне уменьшается при сохранении.
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2560
+# Где делаются миниатюры: 'thread' — фоновый поток процесса,
+# 'sync' — сразу при сохранении картинки, 'command' — только
+# отдельным процессом manage.py generate_thumbnails --watch.
+THUMBNAIL_WORKER = os.getenv('THUMBNAIL_WORKER', default='thread')
+
+# Бюджеты SQL-запросов (QUERY_BUDGETS в urls приложений) проверяются
+# при DEBUG, нарушения пишутся в лог; в тестах — роняют тест.
+QUERY_BUDGET_STRICT = False
+# Сколько раз за запрос допустим один и тот же SQL до подозрения на N+1.
+QUERY_BUDGET_REPEAT_LIMIT = 3
+TEST_RUNNER = 'core.runner.ProjectTestRunner'
+
+# Замеры запроса (core.middleware.ServerTimingMiddleware): заголовок
+# Server-Timing в ответе и JSON-строка в логгере core.requests.
+SERVER_TIMING_HEADER = True
+# Запросы дольше SLOW_QUERY_THRESHOLD секунд (по умолчанию выключено,
+# например SLOW_QUERY_THRESHOLD=0.1) пишутся с планом EXPLAIN QUERY PLAN
+# в SLOW_QUERY_LOG (JSONL с ротацией); сводка по ним —
+# manage.py slow_query_report. Параметры запросов могут содержать
+# данные пользователей и пишутся, только если SLOW_QUERY_LOG_PARAMS.
+SLOW_QUERY_THRESHOLD = os.getenv('SLOW_QUERY_THRESHOLD', default='')
+SLOW_QUERY_THRESHOLD = (
+    float(SLOW_QUERY_THRESHOLD) if SLOW_QUERY_THRESHOLD else None
+)
+SLOW_QUERY_LOG = os.getenv(
+    'SLOW_QUERY_LOG', default=os.path.join(BASE_DIR, 'slow_queries.jsonl')
+)
+SLOW_QUERY_LOG_PARAMS = False
+# Метрики для Prometheus на /metrics (core.metrics): токен, который
+# сборщик передаёт в заголовке Authorization: Bearer <токен> (без токена
+# /metrics выключен), и, при нескольких рабочих процессах, общий каталог
+# их счётчиков (очищается при перезапуске) и как часто процесс его
+# обновляет. За обратным прокси все запросы приходят с его адреса,
+# поэтому снаружи /metrics нужно закрыть и на самом прокси.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', default='')
+METRICS_FLUSH_INTERVAL = 5
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'requests': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'message',
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'core.requests': {
+            'handlers': ['requests'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}